@@ -0,0 +1,135 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "commandUsage" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "name" TEXT NOT NULL,
+    "uses" BIGINT NOT NULL  DEFAULT 0,
+    CONSTRAINT "uid_commandUsag_name_f41671" UNIQUE ("name")
+);
+CREATE TABLE IF NOT EXISTS "commands" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "type" TEXT NOT NULL,
+    "name" TEXT NOT NULL,
+    "category" TEXT NOT NULL,
+    "description" TEXT,
+    "content" TEXT NOT NULL,
+    "url" TEXT,
+    "uses" BIGINT NOT NULL  DEFAULT 0,
+    "ownerId" BIGINT NOT NULL,
+    "createdAt" TIMESTAMP NOT NULL,
+    "visibility" INT NOT NULL  DEFAULT 0,
+    "enabled" INT NOT NULL  DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS "guilds" (
+    "id" BIGINT NOT NULL  PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS "caseCounter" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "lastCaseId" BIGINT NOT NULL  DEFAULT 0,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_caseCounter_guild_i_f8600c" UNIQUE ("guild_id")
+) /* Guild's last case number, so doCaselog doesn't need to MAX(caseId) */;
+CREATE TABLE IF NOT EXISTS "caseLog" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "caseId" BIGINT NOT NULL,
+    "type" TEXT NOT NULL,
+    "modId" BIGINT NOT NULL,
+    "targetId" BIGINT NOT NULL,
+    "reason" TEXT NOT NULL,
+    "createdAt" TIMESTAMP NOT NULL,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_caseLog_guild_i_6691db" ON "caseLog" ("guild_id", "caseId");
+CREATE INDEX IF NOT EXISTS "idx_caseLog_guild_i_763d95" ON "caseLog" ("guild_id", "modId");
+CREATE TABLE IF NOT EXISTS "commandsLookup" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "name" TEXT NOT NULL,
+    "cmd_id" BIGINT NOT NULL REFERENCES "commands" ("id") ON DELETE CASCADE,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_commandsLoo_guild_i_9788f4" ON "commandsLookup" ("guild_id", "name");
+CREATE INDEX IF NOT EXISTS "idx_commandsLoo_cmd_id_3e6254" ON "commandsLookup" ("cmd_id");
+CREATE TABLE IF NOT EXISTS "disabled" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "command" TEXT NOT NULL,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_disabled_guild_i_a38e2a" ON "disabled" ("guild_id");
+CREATE TABLE IF NOT EXISTS "guildChannels" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "welcomeCh" BIGINT,
+    "farewellCh" BIGINT,
+    "modlogCh" BIGINT,
+    "purgatoryCh" BIGINT,
+    "announcementCh" BIGINT,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_guildChanne_guild_i_40e041" UNIQUE ("guild_id")
+);
+CREATE TABLE IF NOT EXISTS "guildConfigs" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "ccMode" INT NOT NULL  DEFAULT 0,
+    "tagMode" INT NOT NULL  DEFAULT 0,
+    "welcomeMsg" TEXT,
+    "farewellMsg" TEXT,
+    "locale" TEXT,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_guildConfig_guild_i_c87df8" UNIQUE ("guild_id")
+);
+CREATE TABLE IF NOT EXISTS "guildMutes" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "mutedId" BIGINT NOT NULL,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_guildMutes_guild_i_642f29" ON "guildMutes" ("guild_id", "mutedId");
+CREATE TABLE IF NOT EXISTS "guildRoles" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "modRole" BIGINT,
+    "mutedRole" BIGINT,
+    "autoRole" BIGINT,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_guildRoles_guild_i_ed2f97" UNIQUE ("guild_id")
+);
+CREATE TABLE IF NOT EXISTS "prefixes" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "prefix" TEXT NOT NULL,
+    "guild_id" BIGINT NOT NULL REFERENCES "guilds" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_prefixes_prefix_073f07" UNIQUE ("prefix", "guild_id")
+);
+CREATE INDEX IF NOT EXISTS "idx_prefixes_guild_i_d409e8" ON "prefixes" ("guild_id");
+CREATE TABLE IF NOT EXISTS "schemaFingerprint" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "fingerprint" VARCHAR(64) NOT NULL,
+    "dataVersion" INT NOT NULL  DEFAULT 0,
+    "updatedAt" TIMESTAMP NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "timer" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "event" TEXT NOT NULL,
+    "extra" JSON NOT NULL,
+    "expires" TIMESTAMP NOT NULL,
+    "created" TIMESTAMP NOT NULL,
+    "owner" BIGINT NOT NULL,
+    "claimedBy" TEXT,
+    "claimedUntil" TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "idx_timer_expires_ad551b" ON "timer" ("expires");
+CREATE INDEX IF NOT EXISTS "idx_timer_owner_9eafbb" ON "timer" ("owner", "event");
+CREATE TABLE IF NOT EXISTS "users" (
+    "id" BIGINT NOT NULL  PRIMARY KEY,
+    "locale" TEXT,
+    "timeZone" TEXT
+);
+CREATE TABLE IF NOT EXISTS "aerich" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "version" VARCHAR(255) NOT NULL,
+    "app" VARCHAR(100) NOT NULL,
+    "content" JSON NOT NULL
+);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        """
@@ -0,0 +1,78 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import time
+import timeit
+from typing import Any
+
+from src.main.core.data import ExpiringDict
+
+
+class LegacyExpiringDict(dict):
+    """ExpiringDict before the expiry queue, walks the whole dict on every access"""
+
+    def __init__(self, maxAgeSeconds: int = 3600) -> None:
+        self.maxAgeSeconds = maxAgeSeconds
+        super().__init__()
+
+    def verifyCache(self) -> None:
+        curTime = time.monotonic()
+        toRemove = [k for (k, (v, t)) in self.items() if curTime > (t + self.maxAgeSeconds)]
+        for k in toRemove:
+            del self[k]
+
+    def __contains__(self, key: Any) -> bool:
+        self.verifyCache()
+        return super().__contains__(key)
+
+    def __getitem__(self, key: Any) -> Any:
+        self.verifyCache()
+        return super().__getitem__(key)[0]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.verifyCache()
+        return super().__setitem__(key, (value, time.monotonic()))
+
+
+def fill(d: dict, size: int) -> dict:
+    # Bypass __setitem__, filling LegacyExpiringDict through it is O(n^2)
+    now = time.monotonic()
+    if isinstance(d, ExpiringDict):
+        for i in range(size):
+            d._set(i, i, now)
+    else:
+        for i in range(size):
+            dict.__setitem__(d, i, (i, now))
+    return d
+
+
+def perOp(stmt, number: int) -> float:
+    """Best of 3, in microseconds per operation"""
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e6
+
+
+def main() -> None:
+    """Micro-benchmark for ExpiringDict lookups
+
+    Usage
+    -----
+    %> python -m src.benchmark.expiringdict
+    """
+    print(f"{'entries':>8} | {'impl':<18} | {'getitem (us/op)':>16} | {'contains (us/op)':>16}")
+    for size in (10_000, 100_000):
+        # Legacy is O(n) per access, use fewer iterations to keep it bearable
+        for name, cls, number in (("LegacyExpiringDict", LegacyExpiringDict, 20), ("ExpiringDict", ExpiringDict, 100_000)):
+            d = fill(cls(maxAgeSeconds=3600), size)
+            key = size // 2
+            getitem = perOp(lambda: d[key], number)
+            contains = perOp(lambda: key in d, number)
+            print(f"{size:>8} | {name:<18} | {getitem:>16.3f} | {contains:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
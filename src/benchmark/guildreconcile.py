@@ -0,0 +1,105 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import random
+import time
+
+from tortoise import Tortoise
+
+from src.main.core import db
+from src.main.core.reconcile import reconcileGuilds
+from src.main.utils import utcnow
+
+
+SIZES = (1_000, 10_000, 100_000)
+# Quadratic, anything above this takes minutes
+LEGACY_MAX = 10_000
+
+
+async def legacy(guildIds: list[int], days: int = 30) -> None:
+    """`manageGuildDeletion` before it was rewritten"""
+    dbGuilds = await db.Guilds.all()
+    dbGuilds = [i.id for i in dbGuilds]
+
+    await db.Guilds.bulk_create([db.Guilds(id=i) for i in guildIds if i not in dbGuilds])
+
+    scheduledGuilds = await db.Timer.filter(event="guild_del")
+    [await i.delete() for i in scheduledGuilds if i.owner in guildIds]
+    scheduledGuildIds = [i.id for i in scheduledGuilds]
+
+    now = utcnow()
+    when = now + datetime.timedelta(days=days)
+    await db.Timer.bulk_create(
+        [
+            db.Timer(id=i, event="guild_del", extra={"args": [], "kwargs": {}}, expires=when, created=now, owner=i)
+            for i in dbGuilds
+            if i not in guildIds and i not in scheduledGuildIds
+        ]
+    )
+
+
+async def populate(size: int, rng: random.Random) -> list[int]:
+    """Synthetic guilds table, returns guilds the bot is "currently" in
+
+    90% of known guilds are still joined, 5% of known guilds are pending
+    deletion (half of them rejoined), and 5% more guilds are new.
+    """
+    known = rng.sample(range(10**17, 10**18), size + size // 20)
+    known, new = known[:size], known[size:]
+    await db.Guilds.bulk_create([db.Guilds(id=i) for i in known], batch_size=1000)
+
+    now = utcnow()
+    pending = known[: size // 20]
+    await db.Timer.bulk_create(
+        [db.Timer(event="guild_del", extra={"args": [], "kwargs": {}}, expires=now, created=now, owner=i) for i in pending],
+        batch_size=1000,
+    )
+
+    joined = known[: size // 40] + known[size // 20 : size // 20 + size * 9 // 10] + new
+    rng.shuffle(joined)
+    return joined
+
+
+async def run(size: int, useLegacy: bool) -> float:
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.main.core.db"]})
+    try:
+        await Tortoise.generate_schemas()
+        guildIds = await populate(size, random.Random(2264))
+
+        start = time.perf_counter()
+        if useLegacy:
+            await legacy(guildIds)
+        else:
+            await reconcileGuilds(guildIds)
+        return time.perf_counter() - start
+    finally:
+        await Tortoise.close_connections()
+
+
+async def _main() -> None:
+    print(f"{'guilds':>8} | {'legacy':>10} | {'set-based':>10}")
+    for size in SIZES:
+        old = f"{await run(size, True):>9.2f}s" if size <= LEGACY_MAX else f"{'skipped':>10}"
+        new = await run(size, False)
+        print(f"{size:>8} | {old} | {new:>9.2f}s")
+
+
+def main() -> None:
+    """Benchmark for boot-time guild reconciliation (`manageGuildDeletion`)
+
+    Usage
+    -----
+    %> python -m src.benchmark.guildreconcile
+    """
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import gc
+import random
+import tracemalloc
+from typing import Any, Callable
+
+from src.main.core.data import CacheProperty, CacheSetProperty
+from src.main.core.settings import GuildSettings
+
+
+GUILDS = 100_000
+
+
+def syntheticGuild(rng: random.Random) -> dict[str, Any]:
+    """Guild's rows as returned by `.values()`, roughly shaped like production
+    data (most guilds only touch a few settings)"""
+    snowflake = lambda: rng.getrandbits(63)  # noqa: E731
+    return {
+        "guildConfigs": {
+            "ccMode": rng.choice((0, 1, 2)),
+            "tagMode": 0,
+            "welcomeMsg": "Welcome {user(mention)}!" if rng.random() < 0.2 else None,
+            "farewellMsg": None,
+            "locale": rng.choice((None, "en-US", "id")),
+        },
+        "guildChannels": {
+            "welcomeCh": snowflake() if rng.random() < 0.2 else None,
+            "farewellCh": None,
+            "modlogCh": snowflake() if rng.random() < 0.3 else None,
+            "purgatoryCh": None,
+            "announcementCh": None,
+        },
+        "guildRoles": {
+            "modRole": snowflake() if rng.random() < 0.3 else None,
+            "mutedRole": snowflake() if rng.random() < 0.3 else None,
+            "autoRole": None,
+        },
+        "mutes": [snowflake() for _ in range(3)] if rng.random() < 0.1 else [],
+        "disabled": ["fun", "weather", "meme", "info"] if rng.random() < 0.05 else [],
+    }
+
+
+def legacy(guilds: dict[int, dict[str, Any]]) -> list[CacheProperty]:
+    """One dict per config table per guild, mutes and disabled commands as list"""
+    caches = [CacheProperty() for _ in range(5)]
+    configs, channels, roles, mutes, disabled = caches
+    for guildId, data in guilds.items():
+        configs.set(guildId, dict(data["guildConfigs"]))
+        channels.set(guildId, dict(data["guildChannels"]))
+        roles.set(guildId, dict(data["guildRoles"]))
+        mutes.set(guildId, list(data["mutes"]))
+        disabled.set(guildId, list(data["disabled"]))
+    return caches
+
+
+def compact(guilds: dict[int, dict[str, Any]]) -> list[CacheProperty]:
+    """Slotted `GuildSettings` per guild, mutes and disabled commands as frozenset"""
+    settings, mutes, disabled = CacheProperty(), CacheSetProperty(), CacheSetProperty()
+    for guildId, data in guilds.items():
+        value = GuildSettings()
+        for table in GuildSettings.TABLES:
+            value.update(data[table])
+        settings.set(guildId, value)
+        mutes.set(guildId, data["mutes"])
+        disabled.set(guildId, data["disabled"])
+    return [settings, mutes, disabled]
+
+
+def measure(build: Callable[[dict[int, dict[str, Any]]], list[CacheProperty]], guilds: dict) -> int:
+    """Bytes allocated (and still alive) by `build`"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build(guilds)  # noqa: F841, keep it alive until measured
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return after - before
+
+
+def main() -> None:
+    """Memory benchmark for per-guild settings cache
+
+    Usage
+    -----
+    %> python -m src.benchmark.guildsettings
+    """
+    rng = random.Random(2264)
+    guilds = {rng.getrandbits(63): syntheticGuild(rng) for _ in range(GUILDS)}
+
+    results = {"legacy (dict/list)": measure(legacy, guilds), "compact (slots/frozenset)": measure(compact, guilds)}
+
+    base = results["legacy (dict/list)"]
+    print(f"{GUILDS} guilds")
+    for name, size in results.items():
+        print(f"{name:<26} | {size / 1024 / 1024:>8.2f} MiB | {size / GUILDS:>7.1f} B/guild | {size / base:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
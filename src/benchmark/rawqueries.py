@@ -0,0 +1,105 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+from tortoise import Tortoise
+
+from src.main.core import db, queries
+from src.main.utils import utcnow
+
+
+GUILDS = 1_000
+READS = 20_000
+
+
+async def ormCustomCommands(guildId: int) -> list[dict[str, Any]]:
+    """`CustomCommandIndex.fetch`'s query before it was moved to raw SQL"""
+    return await db.CommandsLookup.filter(guild_id=guildId).values(
+        "name",
+        "cmd_id",
+        "cmd__name",
+        "cmd__content",
+        "cmd__description",
+        "cmd__category",
+        "cmd__uses",
+        "cmd__url",
+        "cmd__ownerId",
+        "cmd__enabled",
+    )
+
+
+# name -> (ORM, raw)
+HOT_PATHS: dict[str, tuple[Callable[[int], Awaitable[Any]], Callable[[int], Awaitable[Any]]]] = {
+    "prefixes": (lambda g: db.Prefixes.filter(guild_id=g), queries.fetchPrefixes),
+    "disabled commands": (lambda g: db.Disabled.filter(guild_id=g), queries.fetchDisabledCommands),
+    "guild mutes": (lambda g: db.GuildMutes.filter(guild_id=g), queries.fetchGuildMutes),
+    "custom commands": (ormCustomCommands, queries.fetchCustomCommands),
+}
+
+
+async def populate(rng: random.Random) -> list[int]:
+    guildIds = [rng.getrandbits(62) for _ in range(GUILDS)]
+    await db.Guilds.bulk_create([db.Guilds(id=i) for i in guildIds])
+
+    now = utcnow()
+    prefixes, disabled, mutes, lookups = [], [], [], []
+    for guildId in guildIds:
+        prefixes += [db.Prefixes(guild_id=guildId, prefix=p) for p in rng.sample(("?", "!", "zi ", ">>", "$"), 3)]
+        disabled += [db.Disabled(guild_id=guildId, command=c) for c in ("fun", "weather", "meme")]
+        mutes += [db.GuildMutes(guild_id=guildId, mutedId=rng.getrandbits(62)) for _ in range(5)]
+
+        for i in range(10):
+            cmd = await db.Commands.create(type="text", name=f"cmd{i}", content="Hello {user}!", ownerId=0, createdAt=now)
+            lookups += [db.CommandsLookup(cmd_id=cmd.id, name=name, guild_id=guildId) for name in (f"cmd{i}", f"alias{i}")]
+
+    await db.Prefixes.bulk_create(prefixes, batch_size=1000)
+    await db.Disabled.bulk_create(disabled, batch_size=1000)
+    await db.GuildMutes.bulk_create(mutes, batch_size=1000)
+    await db.CommandsLookup.bulk_create(lookups, batch_size=1000)
+    return guildIds
+
+
+async def timeit(fn: Callable[[int], Awaitable[Any]], guildIds: list[int]) -> float:
+    start = time.perf_counter()
+    for i in range(READS):
+        await fn(guildIds[i % len(guildIds)])
+    return time.perf_counter() - start
+
+
+async def _main() -> None:
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.main.core.db"]})
+    try:
+        await Tortoise.generate_schemas()
+        guildIds = await populate(random.Random(2264))
+
+        print(f"{READS} reads over {GUILDS} guilds")
+        print(f"{'hot path':<18} | {'ORM':>8} | {'raw':>8} | {'speedup':>7}")
+        for name, (orm, raw) in HOT_PATHS.items():
+            ormTime = await timeit(orm, guildIds)
+            rawTime = await timeit(raw, guildIds)
+            print(f"{name:<18} | {ormTime:>7.2f}s | {rawTime:>7.2f}s | {ormTime / rawTime:>6.2f}x")
+    finally:
+        await Tortoise.close_connections()
+
+
+def main() -> None:
+    """Benchmark for raw SQL hot-path reads against their ORM equivalent
+
+    Usage
+    -----
+    %> python -m src.benchmark.rawqueries
+    """
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
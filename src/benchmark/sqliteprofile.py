@@ -0,0 +1,97 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from tortoise import Tortoise
+from tortoise.expressions import F
+
+from src.main.core import db, queries
+from src.main.core.config import Config
+from src.main.utils import utcnow
+
+
+ITERATIONS = 2_000
+GUILDS = 100
+
+# name -> (URL query, use `Config.sqliteProfile`)
+PROFILES: dict[str, tuple[str, bool]] = {
+    "rollback journal": ("?journal_mode=DELETE", False),
+    "tortoise defaults": ("", False),
+    "sqlite profile": ("", True),
+}
+
+
+async def workload(rng: random.Random, cmdIds: list[int]) -> int:
+    """Mixed workload, returns how many statements executed"""
+    now = utcnow()
+    for i in range(ITERATIONS):
+        guildId = rng.randrange(GUILDS)
+        # Custom command invoked
+        await queries.fetchPrefixes(guildId)
+        await db.Commands.filter(id=rng.choice(cmdIds)).update(uses=F("uses") + 1)
+        # Moderation action with a timed punishment
+        await db.CaseLog.create(guild_id=guildId, caseId=i, type="mute", modId=0, targetId=i, reason="spam", createdAt=now)
+        timer = await db.Timer.create(
+            event="mute",
+            extra={"args": [], "kwargs": {}},
+            expires=now + datetime.timedelta(minutes=5),
+            created=now,
+            owner=guildId,
+        )
+        await timer.delete()
+    return ITERATIONS * 5
+
+
+async def run(query: str, profile: bool) -> float:
+    """Returns statements per second"""
+    with tempfile.TemporaryDirectory() as directory:
+        config = Config("", f"sqlite://{os.path.join(directory, 'database.db')}{query}", sqliteProfile=profile)
+        await Tortoise.init(config=config.tortoiseConfig)
+        try:
+            await Tortoise.generate_schemas()
+            await db.Guilds.bulk_create([db.Guilds(id=i) for i in range(GUILDS)])
+            await db.Prefixes.bulk_create([db.Prefixes(guild_id=i, prefix="?") for i in range(GUILDS)])
+            cmdIds = [
+                (await db.Commands.create(type="text", name=f"cmd{i}", content="hi", ownerId=0, createdAt=utcnow())).id
+                for i in range(50)
+            ]
+
+            start = time.perf_counter()
+            statements = await workload(random.Random(2264), cmdIds)
+            return statements / (time.perf_counter() - start)
+        finally:
+            await Tortoise.close_connections()
+
+
+async def _main() -> None:
+    print(f"{ITERATIONS} iterations (read prefixes, bump uses, insert case, create and delete timer)")
+    results = {name: await run(query, profile) for name, (query, profile) in PROFILES.items()}
+
+    base = results["tortoise defaults"]
+    for name, rate in results.items():
+        print(f"{name:<18} | {rate:>8.0f} stmt/s | {rate / base:>5.2f}x")
+
+
+def main() -> None:
+    """Write-throughput benchmark for `Config.sqliteProfile`
+
+    Usage
+    -----
+    %> python -m src.benchmark.sqliteprofile
+    """
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
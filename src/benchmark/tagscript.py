@@ -0,0 +1,114 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from itertools import islice
+
+from src import tse
+from src.main.exts.meta._custom_command import _blocks
+from src.tse.exceptions import WorkloadExceededError
+from src.tse.verb import Verb
+
+
+SIZES = (10, 100, 1000)
+
+
+class LegacyInterpreter(tse.Interpreter):
+    """`Interpreter` with `_solve` before it was rewritten"""
+
+    def _solve(self, message, node_ordered_list, response, charlimit, *, verb_limit=2000):
+        final = message
+        total_work = 0
+
+        for i, node in enumerate(node_ordered_list):
+            node.verb = Verb(final[node.coordinates[0] : node.coordinates[1] + 1], limit=verb_limit)
+            ctx = tse.Context(node.verb, response, self, message)
+
+            self._get_acceptors(ctx, node)
+            if node.output is None:
+                continue
+
+            if charlimit is not None:
+                total_work = total_work + len(node.output)
+                if total_work > charlimit:
+                    raise WorkloadExceededError(f"{total_work}/{charlimit}")
+
+            start, end = node.coordinates
+            differential = len(node.output) - ((end + 1) - start)
+            if "TSE_STOP" in response.actions:
+                return final[:start] + node.output
+            final = final[:start] + node.output + final[end + 1 :]
+
+            for future_n in islice(node_ordered_list, i + 1, None):
+                futureStart, futureEnd = future_n.coordinates
+                future_n.coordinates = (
+                    futureStart + differential if futureStart > start else futureStart,
+                    futureEnd + differential if futureEnd > start else futureEnd,
+                )
+
+        return final
+
+
+def script(rng: random.Random, blocks: int) -> str:
+    """Custom command-like script, variables, assignments and nested blocks
+    mixed with some text"""
+    # (template, blocks in it)
+    templates = (
+        ("{user} said hi to {target}. ", 2),
+        ("{{=(v{0}):{{args}}}}{{v{0}}} ", 3),
+        ("{{=(w{0}):{{user}} x}} ", 2),
+        ("{args}! ", 1),
+    )
+    parts = []
+    count = 0
+    while count < blocks:
+        template, size = rng.choice(templates)
+        parts.append(template.format(len(parts)) if "{0}" in template else template)
+        count += size
+    return "".join(parts)
+
+
+def bench(engine: tse.Interpreter, message: str, seed: dict) -> float:
+    runs = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < 0.5:
+        engine.process(message, seed)
+        runs += 1
+    return elapsed / runs
+
+
+def main() -> None:
+    """Benchmark for TagScript interpreter's solver
+
+    Usage
+    -----
+    %> python -m src.benchmark.tagscript
+    """
+    rng = random.Random(2264)
+    seed = {
+        "user": tse.StringAdapter("ZiRO2264"),
+        "target": tse.StringAdapter("someone"),
+        "args": tse.StringAdapter("some arguments"),
+    }
+    legacy = LegacyInterpreter(_blocks)
+    engine = tse.Interpreter(_blocks)
+
+    print(f"{'blocks':>6} | {'chars':>6} | {'legacy':>10} | {'segments':>10} | speedup")
+    for size in SIZES:
+        message = script(rng, size)
+        blocks = len(tse.build_node_tree(message))
+        assert legacy.process(message, seed).body == engine.process(message, seed).body
+
+        old = bench(legacy, message, seed)
+        new = bench(engine, message, seed)
+        print(f"{blocks:>6} | {len(message):>6} | {old * 1000:>8.3f}ms | {new * 1000:>8.3f}ms | {old / new:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
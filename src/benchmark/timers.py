@@ -0,0 +1,250 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+
+from tortoise import Tortoise, connections
+
+from src.main.core import db
+from src.main.core.querystats import QueryStats
+from src.main.exts.timer.timer import Timer, TimerData
+from src.main.utils import utcnow
+
+
+# Fails the run (exit code 1) when exceeded, lag is in seconds
+MAX_P99_LAG = 0.25
+MAX_QUERIES_PER_TIMER = 3.0
+
+
+class SimClock:
+    """Simulated clock, runs in real time but skips ahead instead of sleeping
+
+    Time spent processing (querying the database, etc) still passes, so
+    dispatch lag is measured as if it's running in real time.
+    """
+
+    def __init__(self, start: dt.datetime) -> None:
+        self.start: dt.datetime = start
+        self.restart()
+
+    def restart(self) -> None:
+        self.skipped: float = 0.0
+        self._started: float = time.perf_counter()
+
+    def now(self) -> dt.datetime:
+        return self.start + dt.timedelta(seconds=time.perf_counter() - self._started + self.skipped)
+
+    def advance(self, seconds: float) -> None:
+        self.skipped += seconds
+
+
+class SimBot:
+    """Just enough of `ziBot` for the Timer cog, records dispatched timers"""
+
+    def __init__(self, clock: SimClock, target: int) -> None:
+        self.clock: SimClock = clock
+        self.loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        self.target: int = target
+
+        # (expires, fired at)
+        self.fired: dict[int, tuple[dt.datetime, dt.datetime]] = {}
+        self.duplicates: int = 0
+        self.done: asyncio.Event = asyncio.Event()
+
+    def is_closed(self) -> bool:
+        return self.done.is_set()
+
+    def dispatch(self, event: str, timer: TimerData) -> None:
+        if timer.id in self.fired:
+            self.duplicates += 1
+        self.fired[timer.id] = (timer.expires, self.clock.now())
+        if len(self.fired) >= self.target:
+            self.done.set()
+
+
+class SimTimer(Timer):
+    def __init__(self, bot: Any, clock: SimClock, horizon: dt.datetime) -> None:
+        self.clock: SimClock = clock
+        self.horizon: dt.datetime = horizon
+        # When the first load finished, timers expired before this were
+        # overdue on boot
+        self.readyAt: dt.datetime | None = None
+        super().__init__(bot)
+
+    def now(self) -> dt.datetime:
+        return self.clock.now()
+
+    async def loadTimers(self) -> None:
+        await super().loadTimers()
+        if self.readyAt is None:
+            self.readyAt = self.now()
+
+    async def sleep(self, seconds: float) -> None:
+        if self._wakeUp.is_set():
+            return
+        if self.now() + dt.timedelta(seconds=seconds) >= self.horizon:
+            # Nothing left to dispatch within simulated period
+            self.bot.done.set()
+            return
+        self.clock.advance(seconds)
+        await asyncio.sleep(0)
+
+
+def expiries(rng: random.Random, now: dt.datetime, count: int) -> list[tuple[str, dt.datetime, dt.datetime]]:
+    """Synthetic (event, created, expires), roughly following production mix:
+
+    - reminders, log-normal around an hour, some of them months away
+    - mutes, mostly common durations (10m, 1h, 1d, ...) with some jitter
+    - bans, a few days to a month
+    - guild deletions, 30 days after the bot left, created in bursts (boot)
+    """
+    durations = (600, 3600, 6 * 3600, 86400, 7 * 86400)
+    bursts = [now - dt.timedelta(days=rng.uniform(0, 30)) for _ in range(20)]
+
+    timers = []
+    for _ in range(count):
+        roll = rng.random()
+        created = now
+        if roll < 0.5:
+            event = "reminder"
+            seconds = min(rng.lognormvariate(math.log(3600), 2), 365 * 86400)
+        elif roll < 0.75:
+            event = "mute"
+            seconds = rng.choice(durations) + rng.uniform(0, 5)
+        elif roll < 0.85:
+            event = "ban"
+            seconds = rng.uniform(86400, 30 * 86400)
+        else:
+            event = "guild_del"
+            created = rng.choice(bursts)
+            seconds = 30 * 86400
+        timers.append((event, created, created + dt.timedelta(seconds=seconds)))
+    return timers
+
+
+async def populate(rng: random.Random, now: dt.datetime, count: int) -> None:
+    batch = []
+    for i, (event, created, expires) in enumerate(expiries(rng, now, count)):
+        batch.append(db.Timer(event=event, extra={"args": [], "kwargs": {}}, expires=expires, created=created, owner=i))
+        if len(batch) >= 10_000:
+            await db.Timer.bulk_create(batch, batch_size=1000)
+            batch = []
+    if batch:
+        await db.Timer.bulk_create(batch, batch_size=1000)
+
+
+async def run(count: int, target: int, days: float) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        await Tortoise.init(
+            db_url=f"sqlite://{os.path.join(directory, 'database.db')}", modules={"models": ["src.main.core.db"]}
+        )
+        try:
+            await Tortoise.generate_schemas()
+            start = utcnow()
+            await populate(random.Random(2264), start, count)
+
+            clock = SimClock(start)
+            bot = SimBot(clock, target)
+
+            # Memory used by the in-memory heap
+            probe = SimTimer(bot, clock, start)
+            tracemalloc.start()
+            await probe.loadTimers()
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            loaded = len(probe._timers)
+            del probe
+
+            timer = SimTimer(bot, clock, start + dt.timedelta(days=days))
+            clock.restart()
+
+            stats = QueryStats(threshold=0)
+            stats.instrument(connections.get("default"))
+            with stats.track("timers", None) as queries:
+                # Task copies current context, so its queries are counted
+                await timer.cog_load()
+            await bot.done.wait()
+            await timer.cog_unload()
+
+            readyAt = timer.readyAt or start
+            lags = sorted((fired - expires).total_seconds() for expires, fired in bot.fired.values() if expires >= readyAt)
+            lags = lags or [0.0]
+            return {
+                "loaded": loaded,
+                "fired": len(bot.fired),
+                "overdue": sum(expires < readyAt for expires, _ in bot.fired.values()),
+                "boot": readyAt - start,
+                "duplicates": bot.duplicates,
+                "early": sum(fired < expires for expires, fired in bot.fired.values()),
+                "simulated": clock.now() - start,
+                "p50": statistics.median(lags),
+                "p99": lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+                "max": lags[-1],
+                "queries": queries.queries / max(len(bot.fired), 1),
+                "memory": memory,
+            }
+        finally:
+            await Tortoise.close_connections()
+
+
+async def _main(args: argparse.Namespace) -> int:
+    print(f"{args.timers} timers, dispatching up to {args.fire} of them within {args.days} simulated days")
+    result = await run(args.timers, args.fire, args.days)
+
+    print(f"loaded in memory   | {result['loaded']} timers, {result['memory'] / 2**20:.1f} MiB")
+    print(f"                   | {result['memory'] / max(result['loaded'], 1):.0f} bytes/timer")
+    print(f"fired              | {result['fired']} timers in {result['simulated']} (simulated)")
+    print(f"                   | {result['overdue']} overdue after {result['boot']} of loading on boot")
+    print(f"dispatch lag       | p50 {result['p50'] * 1000:.1f}ms, p99 {result['p99'] * 1000:.1f}ms,", end=" ")
+    print(f"max {result['max'] * 1000:.1f}ms")
+    print(f"queries per timer  | {result['queries']:.2f}")
+
+    failures = []
+    if result["duplicates"] or result["early"]:
+        failures.append(f"{result['duplicates']} timers fired twice, {result['early']} fired early")
+    if result["p99"] > args.max_lag:
+        failures.append(f"p99 dispatch lag {result['p99']:.3f}s > {args.max_lag}s")
+    if result["queries"] > args.max_queries:
+        failures.append(f"{result['queries']:.2f} queries per timer > {args.max_queries}")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main() -> None:
+    """Load-test for the Timer cog's scheduler with simulated clock
+
+    Exits with code 1 when dispatch lag or queries per timer regressed
+
+    Usage
+    -----
+    %> python -m src.benchmark.timers [--timers 100000] [--fire 20000]
+    """
+    parser = argparse.ArgumentParser(prog="python -m src.benchmark.timers")
+    parser.add_argument("--timers", type=int, default=100_000, help="Timers in database")
+    parser.add_argument("--fire", type=int, default=20_000, help="Stop after this many timers dispatched")
+    parser.add_argument("--days", type=float, default=60, help="Stop after this many simulated days")
+    parser.add_argument("--max-lag", type=float, default=MAX_P99_LAG, help="Max p99 dispatch lag in seconds")
+    parser.add_argument("--max-queries", type=float, default=MAX_QUERIES_PER_TIMER, help="Max queries per timer")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,44 +7,55 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 from __future__ import annotations
 
 import asyncio
-import copy
 import datetime
 import json
 import logging
 import os
 import re
-import shutil
 import sys
 from collections import Counter
 from contextlib import suppress
-from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
 import aiohttp
 import discord
 import zmq
 import zmq.asyncio
-from aerich import Command as AerichCommand
 from discord.ext import commands, tasks
+from discord.ext.commands.view import StringView
 from discord.ui import Button
 from tortoise import Tortoise, connections
 from tortoise.exceptions import DBConnectionError, OperationalError
 from tortoise.models import Model
 
 from .. import __version__ as botVersion
-from ..exts.meta._custom_command import CustomCommand
 from ..exts.meta._errors import CCommandDisabled, CCommandNotFound, CCommandNotInGuild
 from ..exts.meta._utils import getDisabledCommands
 from ..exts.timer.timer import Timer, TimerData
 from ..utils import utcnow
 from ..utils.format import formatCmdName
-from . import db
+from . import db, queries
 from .colour import ZColour
 from .config import Config
 from .context import Context
-from .data import JSON, Blacklist, Cache, CacheDictProperty, CacheListProperty
+from .data import (
+    JSON,
+    Blacklist,
+    Cache,
+    CacheListProperty,
+    CacheProperty,
+    CacheSetProperty,
+)
 from .guild import GuildWrapper
 from .i18n import FluentTranslator, Localization
+from .prefix import Prefix, PrefixMatcher
+from .purge import GuildPurger
+from .querystats import QueryStats
+from .reconcile import reconcileGuilds
+from .schema import ensureSchema
+from .settings import GuildSettings, GuildSettingsStore
+from .usage import UsageCounter
+from .warmup import warmCache
 
 
 EXTS = []
@@ -59,22 +70,50 @@ for filename in os.listdir(FMT):
             EXTS.append("main.{}.{}".format(EXTS_DIR, filename))
 
 
+# ZMQ topic for cross-process cache invalidation
+CACHE_INVALIDATE_TOPIC = b"cache.invalidate"
+
 EMOJI_REGEX = re.compile(r";(?P<name>[a-zA-Z0-9_]{2,32});")
 
 
 async def _callablePrefix(bot: ziBot, message: discord.Message) -> list:
-    """Callable Prefix for the bot."""
-    base = [bot.defPrefix]
-    guild: GuildWrapper | None = GuildWrapper.fromContext(message.guild, bot)
-    if guild:
-        prefixes = await guild.getPrefixes()
-        base.extend(prefixes)
-    return commands.when_mentioned_or(*sorted(base))(bot, message)
+    """Callable Prefix for the bot.
+
+    Only used by `get_prefix`, commands are resolved by `ziBot.get_context`
+    using compiled `PrefixMatcher` instead.
+    """
+    matcher = await bot.getPrefixMatcher(message.guild)
+    return list(matcher.prefixes)
+
+
+async def _fetchGuildMutes(guildId: int) -> frozenset[int]:
+    return frozenset(await queries.fetchGuildMutes(guildId))
+
+
+def _resolveTable(table: str | Model) -> Model:
+    if isinstance(table, str):
+        _table: Model | None = getattr(db, table, None)
+    else:
+        _table = table
+
+    if _table is None:
+        raise RuntimeError(f"Unknown table '{table}'")
+    return _table
 
 
 __all__ = ("ziBot",)
 
 
+class _CommandTree(discord.app_commands.CommandTree):
+    async def _call(self, interaction: discord.Interaction) -> None:
+        if interaction.type is not discord.InteractionType.application_command or not interaction.command:
+            return await super()._call(interaction)
+
+        # Account app command's queries, including failed checks and errors
+        with self.client.queryStats.track(formatCmdName(interaction.command), interaction.guild_id):  # type: ignore
+            await super()._call(interaction)
+
+
 class ziBot(commands.Bot):
 
     if TYPE_CHECKING:
@@ -108,6 +147,7 @@ class ziBot(commands.Bot):
             case_insensitive=True,
             intents=intents,
             heartbeat_timeout=150.0,
+            tree_cls=_CommandTree,
         )
 
         # make cogs case insensitive
@@ -128,10 +168,18 @@ class ziBot(commands.Bot):
         self.blacklist: Blacklist = Blacklist("data/blacklist.json")
 
         self.activityIndex: int = 0
-        self.commandUsage: Counter = Counter()
-        self.customCommandUsage: int = 0
+        # Command usage, written to database periodically
+        self.usage: UsageCounter = UsageCounter()
+        # Guild settings changes, written to database shortly after
+        self.settingsStore: GuildSettingsStore = GuildSettingsStore(
+            onWritten=lambda guildId: self.publishCacheInvalidation("guildSettings", guildId)
+        )
+        # Database queries made by each command
+        self.queryStats: QueryStats = QueryStats(self.config.slowQueryThreshold)
         # How many days before guild data get wiped when bot leaves the guild
         self.guildDelDays: int = 30
+        # Deletes data of guilds whose deletion timer completed
+        self.guildPurger: GuildPurger = GuildPurger(onPurged=self.onGuildPurged)
 
         # bot's default prefix
         self.defPrefix: str = self.config.defaultPrefix
@@ -148,36 +196,42 @@ class ziBot(commands.Bot):
         # Caches
         # TODO: Improve type checking support
         self.cache: Cache = (
-            Cache()
+            Cache(maxSize=self.config.cacheSize, ttl=self.config.cacheTTL)
             .add(
                 "prefixes",
                 cls=CacheListProperty,
                 unique=True,
                 limit=15,
+                fetcher=Prefix.fetchPrefixes,
             )
             .add(
-                "guildConfigs",
-                cls=CacheDictProperty,
-            )
-            .add(
-                "guildChannels",
-                cls=CacheDictProperty,
+                "prefixMatchers",
+                cls=CacheProperty,
+                fetcher=self.compilePrefixMatcher,
             )
             .add(
-                "guildRoles",
-                cls=CacheDictProperty,
+                "guildSettings",
+                cls=CacheProperty,
+                fetcher=self.settingsStore.fetch,
             )
             .add(
                 "guildMutes",
-                cls=CacheListProperty,
-                unique=True,
+                cls=CacheSetProperty,
+                fetcher=_fetchGuildMutes,
             )
         )
 
+        # Prefix matcher for DMs, only contains default prefix and mentions
+        self._defaultPrefixMatcher: PrefixMatcher | None = None
+
         self.pubSocket: zmq.asyncio.Socket | None = None
         self.subSocket: zmq.asyncio.Socket | None = None
+        # Subscribed to other bot processes' cache invalidations
+        self.peerSocket: zmq.asyncio.Socket | None = None
         self.repSocket: zmq.asyncio.Socket | None = None
         self.socketTasks: list[asyncio.Task] = []
+        # Used to identify cache invalidations published by this process
+        self.instanceId: str = os.urandom(4).hex()
 
         self.exitCode: int = 0
 
@@ -193,6 +247,14 @@ class ziBot(commands.Bot):
                     raise commands.DisabledCommand
             return True
 
+    @property
+    def commandUsage(self) -> Counter[str]:
+        return self.usage.commands
+
+    @property
+    def customCommandUsage(self) -> int:
+        return self.usage.customCommands
+
     @property
     def ownerIds(self):
         return self.owner_ids
@@ -235,50 +297,17 @@ class ziBot(commands.Bot):
         self.i18n = await Localization.init()
         await self.tree.set_translator(FluentTranslator(self))
 
-        migrationDir = Path("migrations")
-
-        aerichCmd = AerichCommand(
-            tortoise_config=self.config.tortoiseConfig,
-            location=str(migrationDir),
-        )
-
-        if migrationDir.exists():
-            await aerichCmd.init()
+        if not await ensureSchema(self.config):
+            self.logger.info("Database schema unchanged, skipped migrations")
 
-            try:
-                update = await aerichCmd.migrate()
+        for connection in connections.all():
+            self.queryStats.instrument(connection)
 
-                if update:
-                    upgrades = await aerichCmd.upgrade()
-                    if len(upgrades) > 0:
-                        self.logger.warning(f"DB Upgrades done ({len(upgrades)}): {', '.join(upgrades)}")
-
-            except AttributeError:
-                self.logger.warning(
-                    "Unable to retrieve model history from the database! " "Creating model history from scratch..."
-                )
-
-                self._cleanMigrationDir(migrationDir)
-
-                await aerichCmd.init_db(True)
-        else:
-            await aerichCmd.init_db(True)
-
-        await Tortoise.generate_schemas(safe=True)
+        await self.usage.load()
+        self.usage.start()
 
         self.loop.create_task(self.afterReady())
 
-    def _cleanMigrationDir(self, directory: Path):
-        for filename in os.listdir(directory):
-            filePath = directory / filename
-            try:
-                if os.path.isfile(filePath) or os.path.islink(filePath):
-                    os.unlink(filePath)
-                elif os.path.isdir(filePath):
-                    shutil.rmtree(filePath)
-            except Exception as err:
-                print(f"Failed to delete {filePath}. Reason: {err}")
-
     async def afterReady(self) -> None:
         """`setup_hook` but wait until ready"""
         if not self.config.test:
@@ -291,6 +320,9 @@ class ziBot(commands.Bot):
             await self.manageGuildDeletion()
 
             self.changingPresence.start()
+            self.purgeExpiredCache.start()
+            if self.config.sqliteProfile and connections.get("default").capabilities.dialect == "sqlite":
+                self.optimizeDatabase.start()
             await self.zmqBind()
 
         for extension in EXTS:
@@ -301,6 +333,11 @@ class ziBot(commands.Bot):
                 self.tree.get_command(merge.name).add_command(command.app_command)  # type: ignore
                 self.tree.remove_command(command.name)
 
+        if self.config.cacheWarmup and not self.config.test:
+            # Extensions need to be loaded first, some of them registering
+            # their own cache (e.g. disabled commands)
+            await self.warmUpCache()
+
         if not hasattr(self, "uptime"):
             self.uptime: datetime.datetime = utcnow()
 
@@ -312,7 +349,9 @@ class ziBot(commands.Bot):
         subPort = self.config.zmqPorts.get("SUB")
         repPort = self.config.zmqPorts.get("REP")
 
-        if not pubPort and not subPort and not repPort:
+        peers = self.config.zmqPeers
+
+        if not pubPort and not subPort and not repPort and not peers:
             return
 
         context = zmq.asyncio.Context.instance()
@@ -327,6 +366,13 @@ class ziBot(commands.Bot):
             self.subSocket.bind(f"tcp://*:{subPort}")
             self.socketTasks.append(asyncio.create_task(self.onZMQReceivePUBMessage()))
 
+        if peers:
+            self.peerSocket = context.socket(zmq.SUB)
+            self.peerSocket.setsockopt(zmq.SUBSCRIBE, CACHE_INVALIDATE_TOPIC)
+            for peer in peers:
+                self.peerSocket.connect(peer)
+            self.socketTasks.append(asyncio.create_task(self.onZMQReceivePeerMessage()))
+
         if repPort:
             self.repSocket = context.socket(zmq.REP)
             self.repSocket.bind(f"tcp://*:{repPort}")
@@ -336,14 +382,70 @@ class ziBot(commands.Bot):
         if not self.subSocket:
             return
 
-        try:
-            while True:
+        while True:
+            try:
                 message = json.loads(await self.subSocket.recv_string())
 
-                channel: discord.TextChannel = self.get_channel(814009733006360597)  # type: ignore
-                await channel.send(f"Received message '{message}'")
-        except Exception as e:
-            print(e)
+                channel: discord.TextChannel | None = self.get_channel(814009733006360597)  # type: ignore
+                if channel:
+                    await channel.send(f"Received message '{message}'")
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                # Keep receiving, a bad message shouldn't stop the loop
+                self.logger.warning(f"Failed to handle SUB message: {err}")
+
+    async def onZMQReceivePeerMessage(self):
+        if not self.peerSocket:
+            return
+
+        while True:
+            try:
+                frames = await self.peerSocket.recv_multipart()
+                self.onCacheInvalidation(frames[-1])
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                self.logger.warning(f"Failed to handle cache invalidation: {err}")
+
+    def onCacheInvalidation(self, payload: bytes) -> None:
+        """Apply cache invalidation published by other bot process"""
+        try:
+            origin, namespace, key = json.loads(payload)
+            key = int(key)
+        except (ValueError, TypeError) as err:
+            self.logger.warning(f"Received invalid cache invalidation: {err}")
+            return
+
+        if origin == self.instanceId:
+            return
+
+        if namespace not in self.cache.property:
+            self.logger.warning(f"Received cache invalidation for unknown namespace: {namespace!r}")
+            return
+
+        self.invalidateCache(namespace, key)
+
+    def invalidateCache(self, namespace: str, key: int) -> None:
+        """Drop cached value of a guild in this process"""
+        if namespace not in self.cache.property:
+            return
+
+        cached: CacheProperty = getattr(self.cache, namespace)
+
+        cached.clear(key)
+        if namespace == "prefixes":
+            # Compiled from cached prefixes
+            self.cache.prefixMatchers.clear(key)  # type: ignore
+
+    async def publishCacheInvalidation(self, namespace: str, key: int) -> None:
+        """Tell other bot processes to drop their cached value of a guild,
+        should be called everytime guild's data is changed"""
+        if not self.pubSocket:
+            return
+
+        payload = json.dumps([self.instanceId, namespace, key]).encode()
+        await self.pubSocket.send_multipart([CACHE_INVALIDATE_TOPIC, payload])
 
     async def onZMQReceiveREQMessage(self):
         if not self.repSocket:
@@ -362,66 +464,46 @@ class ziBot(commands.Bot):
         except Exception as e:
             print(e)
 
+    async def getGuildSettings(self, guildId: int) -> GuildSettings:
+        """Get guild's settings (configs, channels, and roles), load it from
+        database if it's not cached yet"""
+        return await self.cache.guildSettings.fetch(guildId)  # type: ignore
+
     async def getGuildConfigs(
         self,
         guildId: int,
         table: str | Model = "GuildConfigs",  # type: ignore
     ) -> dict[str, Any]:
-        # TODO - Cleaner caching system, use the cache system directly to
-        # handle these stuff
-        if isinstance(table, str):
-            table: Model | None = getattr(db, table, None)  # type: ignore
-
-        if table is None:
-            raise RuntimeError("Huh?")
-
-        # Get guild configs and maybe cache it
-        cached: CacheDictProperty = getattr(self.cache, table._meta.db_table)
-        if cached.get(guildId) is None:
-            # Executed when guild configs is not in the cache
-            config = await table.filter(guild_id=guildId).first().values() or {}  # type: ignore
-
-            for i in ("id", "guild_id"):
-                config.pop(i, None)
-            cached.set(guildId, config)
-        return cached.get(guildId, {})
+        _table = _resolveTable(table)
+        settings = await self.getGuildSettings(guildId)
+        return settings.asDict(_table._meta.db_table)
 
     async def getGuildConfig(self, guildId: int, configType: str, table: str | Model = "GuildConfigs") -> Any | None:
         # Get guild's specific config
-        configs: dict = await self.getGuildConfigs(guildId, table)
-        return configs.get(configType)
+        _table = _resolveTable(table)
+        if configType not in GuildSettings.TABLES[_table._meta.db_table]:
+            return None
+
+        return (await self.getGuildSettings(guildId)).get(configType)
 
     async def setGuildConfig(
         self, guildId: int, configType: str, configValue, table: str | Model = "GuildConfigs"
     ) -> Any | None:
-        if isinstance(table, str):
-            _table: Model = getattr(db, table, None)  # type: ignore
-        else:
-            _table: Model = table
-
-        if not _table:
-            raise RuntimeError("Wtf?")
+        _table = _resolveTable(table)
 
         # Set/edit guild's specific config
-        if (config := await self.getGuildConfig(guildId, configType, table)) == configValue:
+        settings = await self.getGuildSettings(guildId)
+        if settings.get(configType) == configValue:
             # cached value is equal to new value
             # No need to overwrite database value
-            return config
-
-        kwargs = {
-            "guild_id": guildId,
-            configType: configValue,
-        }
-
-        await _table.create(**kwargs)
-        # await _table.update_or_create(**kwargs)
+            return configValue
 
-        # Overwrite current configs
-        cached: CacheDictProperty = getattr(self.cache, _table._meta.db_table)
-        newData = {configType: configValue}
-        cached.set(guildId, newData)
+        # Written to database (and published to other processes) later,
+        # alongside other changes made around the same time
+        self.settingsStore.set(guildId, _table._meta.db_table, {configType: configValue})
+        settings.update({configType: configValue})
 
-        return cached.get(guildId, {}).get(configType, None)
+        return settings.get(configType)
 
     @tasks.loop(seconds=15)
     async def changingPresence(self) -> None:
@@ -445,50 +527,40 @@ class ziBot(commands.Bot):
 
         await self.change_presence(activity=activities[self.activityIndex])
 
-    async def manageGuildDeletion(self) -> None:
-        """Manages guild deletion from database on boot"""
-        timer: Timer | None = self.get_cog("Timer")  # type: ignore
+    async def warmUpCache(self) -> None:
+        """Bulk-load guild settings into the cache"""
+        result = await warmCache(self.cache, [g.id for g in self.guilds])
+        self.logger.warning(
+            "Cache warm-up done: {0.rows} rows for {0.guilds} guilds loaded in {0.elapsed:.2f}s ({0.queries} queries)".format(
+                result
+            )
+        )
 
-        dbGuilds = await db.Guilds.all()
-        dbGuilds = [i.id for i in dbGuilds]
-        guildIds = [i.id for i in self.guilds]
+    @tasks.loop(minutes=10)
+    async def purgeExpiredCache(self) -> None:
+        """Reclaim memory used by expired cache that never accessed again"""
+        purged = self.cache.purgeExpired()
+        if purged:
+            self.logger.info(f"Purged {purged} expired cache")
 
-        # Insert new guilds
-        await db.Guilds.bulk_create([db.Guilds(id=i) for i in guildIds if i not in dbGuilds])
+    @tasks.loop(hours=6)
+    async def optimizeDatabase(self) -> None:
+        """Let SQLite refresh query planner statistics of tables that need it"""
+        await connections.get("default").execute_script("PRAGMA optimize")
 
-        scheduledGuilds = await db.Timer.filter(event="guild_del")
-        cancelledScheduleGuilds = [await i.delete() for i in scheduledGuilds if i.owner in guildIds]
-        scheduledGuildIds = [i.id for i in scheduledGuilds]
+    async def manageGuildDeletion(self) -> None:
+        """Manages guild deletion from database on boot"""
+        timer: Timer | None = self.get_cog("Timer")  # type: ignore
 
-        # Schedule delete guild where the bot no longer in
-        now = utcnow()
-        when = now + datetime.timedelta(days=self.guildDelDays)
-
-        await db.Timer.bulk_create(
-            [
-                db.Timer(
-                    id=i,
-                    event="guild_del",
-                    extra={"args": [], "kwargs": {}},
-                    expires=when,
-                    created=now,
-                    owner=i,
-                )
-                for i in dbGuilds
-                if i not in guildIds and i not in scheduledGuildIds
-            ]
+        result = await reconcileGuilds([g.id for g in self.guilds], days=self.guildDelDays)
+        self.logger.warning(
+            "Guild reconciliation done: {0.inserted} new, {0.scheduled} scheduled for deletion, "
+            "{1} deletion cancelled in {0.elapsed:.2f}s".format(result, len(result.cancelled))
         )
 
-        if not timer:
-            return
-
-        # Restart timer task
-        if timer._currentTimer and (
-            timer._currentTimer.owner in cancelledScheduleGuilds or when < timer._currentTimer.expires
-        ):
-            timer.restartTimer()
-        elif not timer._currentTimer:
-            timer.restartTimer()
+        if timer and (result.scheduled or result.cancelled):
+            # Timers changed directly in database
+            await timer.loadTimers()
 
     async def on_guild_join(self, guild: discord.Guild) -> None:
         """Executed when bot joins a guild"""
@@ -497,6 +569,7 @@ class ziBot(commands.Bot):
         await db.Guilds.create(id=guild.id)
 
         # Cancel deletion
+        self.guildPurger.cancel(guild.id)
         await self.cancelDeletion(guild)
 
     async def on_guild_remove(self, guild: discord.Guild) -> None:
@@ -521,27 +594,22 @@ class ziBot(commands.Bot):
         if not timer:
             return
 
-        # Remove the deletion timer and restart timer task
-        await db.Timer.filter(owner=guild.id, event="guild_del").delete()
-
-        if timer._currentTimer and timer._currentTimer.owner == guild.id:
-            timer.restartTimer()
+        # Remove the deletion timer
+        await timer.cancelTimers(owner=guild.id, event="guild_del")
 
     async def on_guild_del_timer_complete(self, timer: TimerData) -> None:
         """Executed when guild deletion timer completed"""
         await self.waitUntilReady()
         guildId: int = timer.owner
 
-        guildIds: list[int] = [i.id for i in self.guilds]
-        if guildId in guildIds:
+        if self.get_guild(guildId):
             # The bot rejoin, about the function
             return
 
-        # Delete all guild's custom command
-        commands = await CustomCommand.getAll(discord.Object(id=guildId))
-        [await db.Commands.filter(id=i.id).delete() for i in commands]
-        await db.Guilds.filter(id=guildId).delete()
+        self.guildPurger.schedule(guildId)
 
+    async def onGuildPurged(self, guildId: int) -> None:
+        """Executed after guild's data is deleted from database"""
         # clear guild's cache
         for dataType in self.cache.property:
             try:
@@ -549,37 +617,68 @@ class ziBot(commands.Bot):
             except KeyError:
                 pass
 
-    async def get_context(self, message, *, cls=Context):
-        return await super().get_context(message, cls=cls)
+    async def getPrefixMatcher(self, guild: discord.Guild | None) -> PrefixMatcher:
+        """Get guild's compiled prefix matcher, compile it if it's not cached yet"""
+        if not guild:
+            if not self._defaultPrefixMatcher:
+                self._defaultPrefixMatcher = PrefixMatcher(self.defPrefix, (), self.requireUser().id)
+            return self._defaultPrefixMatcher
+
+        return await self.cache.prefixMatchers.fetch(guild.id)  # type: ignore
+
+    async def compilePrefixMatcher(self, guildId: int) -> PrefixMatcher:
+        """Fetcher for `cache.prefixMatchers`"""
+        prefixes = await self.cache.prefixes.fetch(guildId)  # type: ignore
+        return PrefixMatcher(self.defPrefix, prefixes, self.requireUser().id)
+
+    async def matchPrefix(self, message: discord.Message) -> tuple[str, str] | None:
+        """Get (prefix, priority marker) of a message, return None when it's
+        not a command (not prefixed or sent by the bot itself)"""
+        if message.author.id == self.requireUser().id:
+            return None
+
+        matcher = await self.getPrefixMatcher(message.guild)
+        return matcher.match(message.content)
+
+    def _contextFromMatch(self, message: discord.Message, match: tuple[str, str] | None, cls=Context):
+        view = StringView(message.content)
+        ctx = cls(prefix=None, view=view, bot=self, message=message)
+        if match is None:
+            return ctx
+
+        prefix, marker = match
+        view.skip_string(prefix)
+        if marker:
+            # Turn `>command` into `command`
+            view.skip_string(marker)
+            ctx.priorityPrefix = marker
 
-    async def process_commands(self, message: discord.Message) -> (str | commands.Command | commands.Group) | None:
-        # initial ctx
-        ctx: Context = await self.get_context(message)
+        invoker = view.get_word()
+        ctx.invoked_with = invoker
+        ctx.prefix = prefix
+        ctx.command = self.all_commands.get(invoker)
+        return ctx
 
-        if not ctx.prefix:
-            return
+    async def get_context(self, origin, *, cls=Context):
+        if not isinstance(origin, discord.Message):
+            return await super().get_context(origin, cls=cls)
 
-        # 0 = Built-In, 1 = Custom
-        priority = 0
-        unixStyle = False
-
-        # Handling custom command priority
-        msg = copy.copy(message)
-        # Get msg content without prefix
-        msgContent: str = msg.content[len(ctx.prefix) :]
-        # TODO: Add ability add custom priority prefix
-        if msgContent.startswith(">") or msgContent.startswith("!") or (unixStyle := msgContent.startswith("./")):
-            # Also support `./` for unix-style of launching custom scripts
-            priority = 1
+        return self._contextFromMatch(origin, await self.matchPrefix(origin), cls=cls)
 
-            # Turn `>command` into `command`
-            msgContent = msgContent[2 if unixStyle else 1 :]
+    async def process_commands(self, message: discord.Message) -> (str | commands.Command | commands.Group) | None:
+        # Resolve prefix and custom command priority in one go, most messages
+        # aren't commands so skip building their context
+        match = await self.matchPrefix(message)
+        if match is None:
+            return
 
-            # Properly get command when priority is 1
-            msg.content = ctx.prefix + msgContent
+        ctx: Context = self._contextFromMatch(message, match)
 
-            # This fixes the problem, idk how ._.
-            ctx = await self.get_context(msg)
+        # 0 = Built-In, 1 = Custom
+        priority = ctx.priority
+
+        # Get msg content without prefix (and priority marker)
+        msgContent: str = message.content[len(ctx.prefix) + len(ctx.priorityPrefix) :]
 
         # Get arguments for custom commands
         tmp = msgContent.split(" ")
@@ -597,15 +696,24 @@ class ziBot(commands.Bot):
         executeCC = self.get_command("command run")
 
         # Handling command invoke with priority
+        guildId = ctx.guild.id if ctx.guild else None
         if (not canRun or priority >= 1) and executeCC:
-            with suppress(CCommandNotFound, CCommandNotInGuild, CCommandDisabled):
+            with self.queryStats.track(formatCmdName(executeCC), guildId), suppress(
+                CCommandNotFound, CCommandNotInGuild, CCommandDisabled
+            ):
                 await executeCC(*args)  # type: ignore
-                self.customCommandUsage += 1
                 return ""
         # Since priority is 0 and it can run the built-in command,
         # no need to try getting custom command
         # Also executed when custom command failed to run
-        await self.invoke(ctx)
+        if not ctx.command:
+            await self.invoke(ctx)
+            return ctx.command
+
+        with self.queryStats.track(formatCmdName(ctx.command), guildId) as queries:
+            await self.invoke(ctx)
+            # Subcommand is only resolved on invoke
+            queries.name = formatCmdName(ctx.invoked_subcommand or ctx.command)
         return ctx.command
 
     async def processNoNitroEmoji(self, message: discord.Message):
@@ -643,10 +751,10 @@ class ziBot(commands.Bot):
         if not processed:
             return await self.processNoNitroEmoji(message)
         if processed and not isinstance(processed, str):
-            self.commandUsage[formatCmdName(processed)] += 1
+            self.usage.increment(formatCmdName(processed))
 
     async def on_app_command_completion(self, _, command: discord.app_commands.Command | discord.app_commands.ContextMenu):
-        self.commandUsage[formatCmdName(command)] += 1
+        self.usage.increment(formatCmdName(command))
 
     async def on_message(self, message: discord.Message) -> None:
         if (
@@ -701,13 +809,29 @@ class ziBot(commands.Bot):
         """Properly close/turn off bot"""
         if not self.config.test:
             await super().close()
+        else:
+            # Normally done by `super().close()`, cogs' tasks (e.g. timer
+            # dispatcher) have to stop before database connections are closed
+            for cog in tuple(self.cogs):
+                await self.remove_cog(cog)
+
+        # Write pending command usage and settings before closing database
+        # connections
+        await self.usage.close()
+        await self.settingsStore.close()
+        await self.guildPurger.close()
+
+        if self.optimizeDatabase.is_running():
+            # Recommended to run right before closing the connection
+            self.optimizeDatabase.cancel()
+            await self.optimizeDatabase()
 
         # Close database connections
         await connections.close_all()
         if self.config.test:
             await Tortoise._drop_databases()
 
-        sockets = (self.pubSocket, self.subSocket, self.repSocket)
+        sockets = (self.pubSocket, self.subSocket, self.peerSocket, self.repSocket)
         for socket in sockets:
             if not socket:
                 continue
@@ -8,6 +8,20 @@ from __future__ import annotations
 
 from typing import Any
 
+from tortoise.backends.base.config_generator import expand_db_url
+
+
+# Pragmas for `Config.sqliteProfile`, applied to every new connection
+SQLITE_PROFILE: dict[str, Any] = {
+    "journal_mode": "WAL",
+    # WAL is still durable against application crash, only the last
+    # transactions may be lost on power loss
+    "synchronous": "NORMAL",
+    "cache_size": -65536,  # in KiB, 64 MiB
+    "mmap_size": 268435456,  # 256 MiB
+    "temp_store": "MEMORY",
+}
+
 
 class Config:
     """A class that holds the bot's configuration"""
@@ -28,6 +42,12 @@ class Config:
         "useAerich",
         "destUrl",
         "isDataMigration",
+        "cacheSize",
+        "cacheTTL",
+        "cacheWarmup",
+        "zmqPeers",
+        "slowQueryThreshold",
+        "sqliteProfile",
     )
 
     def __init__(
@@ -46,6 +66,12 @@ class Config:
         zmqPorts: dict[str, int] | None = None,
         destUrl: str | None = None,
         isDataMigration: bool = False,
+        cacheSize: int | None = None,
+        cacheTTL: int | None = None,
+        cacheWarmup: bool = False,
+        zmqPeers: list[str] | None = None,
+        slowQueryThreshold: float | None = None,
+        sqliteProfile: bool = False,
     ):
         self.token = token
         self.defaultPrefix = defaultPrefix or ">"
@@ -61,6 +87,29 @@ class Config:
         self.internalApiHost = internalApiHost or "127.0.0.1:2264"
         self.test = test
         self.zmqPorts = zmqPorts or {}
+        # Max guilds cached per cache property, and how long (in seconds)
+        # they're cached. 0 = Unlimited
+        self.cacheSize: int = cacheSize if cacheSize is not None else 10000
+        self.cacheTTL: int = cacheTTL if cacheTTL is not None else 21600
+        # Bulk-load guild settings into the cache on boot
+        self.cacheWarmup: bool = cacheWarmup
+        # PUB endpoints of other bot processes sharing the same database,
+        # used to receive their cache invalidations
+        self.zmqPeers: list[str] = zmqPeers or []
+        # Queries taking longer than this (in seconds) are logged. 0 = Disabled
+        self.slowQueryThreshold: float = slowQueryThreshold if slowQueryThreshold is not None else 0.25
+        # Tune SQLite for single-node deployment (see `SQLITE_PROFILE`)
+        self.sqliteProfile: bool = sqliteProfile
+
+    @property
+    def defaultConnection(self) -> str | dict[str, Any]:
+        if not (self.sqliteProfile and self.databaseUrl.startswith("sqlite://")):
+            return self.databaseUrl
+
+        ret = expand_db_url(self.databaseUrl)
+        # Pragmas set in the URL (e.g. "?synchronous=FULL") take priority
+        ret["credentials"] = SQLITE_PROFILE | ret["credentials"]
+        return ret
 
     @property
     def tortoiseConfig(self):
@@ -72,7 +121,7 @@ class Config:
         if not ret:
             ret = {
                 "connections": {
-                    "default": self.databaseUrl,
+                    "default": self.defaultConnection,
                 },
                 "apps": {
                     "models": {
@@ -31,6 +31,13 @@ class Context(commands.Context):
 
     def __init__(self, **kwargs) -> None:
         super().__init__(**kwargs)
+        # Set by ziBot.get_context when message is prefixed with `>`, `!` or `./`
+        self.priorityPrefix: str = ""
+
+    @property
+    def priority(self) -> int:
+        """0 = Built-In, 1 = Custom"""
+        return 1 if self.priorityPrefix else 0
 
     @property
     def session(self) -> aiohttp.ClientSession:
@@ -6,30 +6,57 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import time
 import uuid
+from collections import OrderedDict, deque
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+
+# Sentinel for cache misses, since None is a valid cached value
+_MISSING: Any = object()
+_EMPTY_SET: frozenset = frozenset()
+
+# Coroutine function that loads a key's value, usually from database
+Fetcher = Callable[[int], Awaitable[Any]]
 
 
 # https://github.com/Rapptz/RoboDanny/blob/rewrite/cogs/utils/cache.py#L22-L43
 class ExpiringDict(dict):
-    """Subclassed dict for expiring cache"""
+    """Subclassed dict for expiring cache
+
+    Every key share the same max age, so insertion order is also expiry
+    order. Keys are queued as they're set and expired keys are popped from the
+    front of the queue, each key is only removed once so every access costs
+    amortized O(1) instead of walking the whole dict.
+    """
 
     def __init__(self, items: Optional[dict] = None, maxAgeSeconds: Optional[int] = None) -> None:
         self.maxAgeSeconds: int = maxAgeSeconds or 3600  # (Default: 3600 seconds (1 hour))
+        # (set time, key), ordered by set time
+        self._queue: deque[tuple[float, Any]] = deque()
         curTime: float = time.monotonic()
 
-        items = items or {}
-        super().__init__({k: (v, curTime) for k, v in items.items()})
+        super().__init__()
+        for k, v in (items or {}).items():
+            self._set(k, v, curTime)
+
+    def _set(self, key: Any, value: Any, curTime: float) -> None:
+        super().__setitem__(key, (value, curTime))
+        self._queue.append((curTime, key))
 
     def verifyCache(self) -> None:
         curTime: float = time.monotonic()
-        toRemove: list = [k for (k, (v, t)) in self.items() if curTime > (t + self.maxAgeSeconds)]
-        for k in toRemove:
-            del self[k]
+        queue = self._queue
+        while queue and curTime > (queue[0][0] + self.maxAgeSeconds):
+            t, k = queue.popleft()
+            entry = super().get(k)
+            # Skip keys that have been overwritten (or deleted) since queued
+            if entry is not None and entry[1] == t:
+                super().__delitem__(k)
 
     def __contains__(self, key: Any) -> bool:
         self.verifyCache()
@@ -51,7 +78,7 @@ class ExpiringDict(dict):
 
     def __setitem__(self, key: Any, value: Any) -> None:
         self.verifyCache()
-        return super().__setitem__(key, (value, time.monotonic()))
+        self._set(key, value, time.monotonic())
 
 
 class CacheError(Exception):
@@ -70,82 +97,217 @@ class CacheListFull(CacheError):
 
 
 class CacheProperty:
-    """Base Class for Cache Property"""
+    """Base Class for Cache Property
+
+    Bounded, per-namespace cache keyed by snowflake (int). Least recently used
+    keys are evicted once `maxSize` is reached and keys expire `ttl` seconds
+    after they're set. Set `maxSize`/`ttl` to 0 to disable them.
+
+    Misses are loaded through `fetcher` (read-through), concurrent misses for
+    the same key share a single in-flight fetch.
+    """
 
     # issubclass doesn't work properly, this is the best workaround i could think of
     isCacheProperty: bool = True
 
-    def __init__(self, unique: bool = False, ttl: int = 0) -> None:
+    def __init__(self, unique: bool = False, ttl: int = 0, maxSize: int = 0, fetcher: Fetcher | None = None) -> None:
         self.unique: bool = unique  # Only unique value can be added/appended
-        self._items: dict[str, Any] = {} if ttl < 1 else ExpiringDict(maxAgeSeconds=ttl)
+        self.ttl: int = ttl
+        self.maxSize: int = maxSize
+        self.fetcher: Fetcher | None = fetcher
+
+        # key -> in-flight fetch, shared by concurrent misses
+        self._inflight: dict[int, asyncio.Future] = {}
+
+        self._items: OrderedDict[int, Any] = OrderedDict()
+        # key -> expiry time (time.monotonic()), only used when ttl is set
+        self._expires: dict[int, float] = {}
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expired: int = 0
 
     def __repr__(self) -> str:
-        return f"<CacheProperty: {self._items}>"
+        return f"<{type(self).__name__}: size={len(self._items)} maxSize={self.maxSize} ttl={self.ttl}>"
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: int) -> bool:
+        return self._peek(key, _MISSING) is not _MISSING
 
     @property
     def items(self) -> dict:
         return self._items
 
-    def set(self, _key: Any, value: Any) -> CacheProperty:
-        # Will bypass unique check
-        key: str = str(_key)
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._items),
+            "maxSize": self.maxSize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+    def _expire(self, key: int) -> None:
+        del self._items[key]
+        del self._expires[key]
+        self.expired += 1
+
+    def _peek(self, key: int, fallback: Any = None) -> Any:
+        """Get cached value without updating stats and LRU order"""
+        try:
+            value = self._items[key]
+        except KeyError:
+            return fallback
 
-        self._items.update({key: value})
+        if self.ttl and self._expires[key] < time.monotonic():
+            self._expire(key)
+            return fallback
+        return value
+
+    def set(self, key: int, value: Any) -> CacheProperty:
+        # Will bypass unique check
+        # In-flight fetch (if any) is now outdated, don't let it overwrite this value
+        self._inflight.pop(key, None)
+
+        items = self._items
+        items[key] = value
+        items.move_to_end(key)
+        if self.ttl:
+            self._expires[key] = time.monotonic() + self.ttl
+
+        if self.maxSize:
+            while len(items) > self.maxSize:
+                oldest, _ = items.popitem(last=False)
+                self._expires.pop(oldest, None)
+                self.evictions += 1
         return self
 
-    def add(self, _key: Any, value: Any) -> CacheProperty:
-        key: str = str(_key)
+    def prime(self, key: int, value: Any) -> bool:
+        """Set value only if key is not cached nor being fetched, used to
+        pre-populate the cache without overwriting fresher value"""
+        if key in self._inflight or key in self:
+            return False
+        self.set(key, value)
+        return True
 
-        if self.unique and key in self._items:
+    def add(self, key: int, value: Any) -> CacheProperty:
+        if self.unique and key in self:
             raise CacheUniqueViolation
 
         return self.set(key, value)
 
-    def __getitem__(self, _key: Any) -> Any:
-        key = str(_key)
+    def __getitem__(self, key: int) -> Any:
+        value = self._peek(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            raise KeyError(key)
 
-        return self._items[key]
+        self.hits += 1
+        self._items.move_to_end(key)
+        return value
 
-    def get(self, key: Any, fallback: Any = None) -> Any:
+    def get(self, key: int, fallback: Any = None) -> Any:
         try:
             return self.__getitem__(key)
         except KeyError:
             return fallback
 
-    def clear(self, key: Any) -> None:
+    async def fetch(self, key: int) -> Any:
+        """Get cached value, or load it with the registered fetcher"""
+        if not self.fetcher:
+            raise CacheError("No fetcher registered")
+        return await self.getOrFetch(key, self.fetcher)
+
+    async def getOrFetch(self, key: int, fetcher: Fetcher) -> Any:
+        """Get cached value, or fetch it (usually from database) and cache it
+        when it's not cached yet
+
+        Concurrent misses for the same key await the same fetch instead of
+        each of them querying the database.
+
+        Usage
+        -----
+        >>> async def fetchPrefixes(guildId: int) -> list[str]:
+        ...     return [p.prefix for p in await db.Prefixes.filter(guild_id=guildId)]
+        >>> await cache.prefixes.getOrFetch(guild.id, fetchPrefixes)
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        while (future := self._inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # We're the one being cancelled
+                    raise
+                # The fetch got cancelled, try again
+                value = self.get(key, _MISSING)
+                if value is not _MISSING:
+                    return value
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fetcher(key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved, waiters (if any) will re-raise it
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # Only cache it if it's not invalidated/overwritten while fetching
+            if self._inflight.get(key) is future:
+                self.set(key, value)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+        return value
+
+    def clear(self, key: int) -> None:
+        self._inflight.pop(key, None)
         try:
-            del self._items[str(key)]
+            del self._items[key]
         except KeyError:
             # Not exists
             pass
+        self._expires.pop(key, None)
 
+    def purgeExpired(self) -> int:
+        """Remove every expired keys, returns how many keys removed"""
+        if not self.ttl:
+            return 0
 
-class CacheDictProperty(CacheProperty):
-    """Cache Dict Property"""
+        now = time.monotonic()
+        expired = [k for k, t in self._expires.items() if t < now]
+        for k in expired:
+            self._expire(k)
+        return len(expired)
 
-    def __init__(
-        self,
-        unique: bool = False,
-        ttl: int = 0,
-    ) -> None:
-        super().__init__(unique=unique, ttl=ttl)
-        self._items: dict[str, Any] = {}
 
-    def set(self, _key: Any, value: dict[str, Any]) -> CacheDictProperty:
-        key: str = str(_key)
+class CacheDictProperty(CacheProperty):
+    """Cache Dict Property"""
 
+    def set(self, key: int, value: dict[str, Any]) -> CacheDictProperty:
         if not isinstance(value, dict):
             raise RuntimeError("Only dict value is allowed!")
-        try:
-            self._items[key].update(value)
-        except KeyError:
-            super().set(key, value)
-        return self
 
-    # def add(self, key: str, value: Dict[str, Any]) -> CacheDictProperty:
-    #     key = str(key)
-
-    #     return self.set(key, value)
+        current = self._peek(key)
+        if current is not None:
+            current.update(value)
+            value = current
+        super().set(key, value)
+        return self
 
     add = set
 
@@ -158,6 +320,9 @@ class CacheListProperty(CacheProperty):
         unique: bool = False,
         blacklist: Iterable = tuple(),
         limit: int = 0,
+        ttl: int = 0,
+        maxSize: int = 0,
+        fetcher: Fetcher | None = None,
     ) -> None:
         """
         Usage
@@ -174,64 +339,61 @@ class CacheListProperty(CacheProperty):
         __main__.CacheUniqueViolation: Unique Value Violation
         ...
         """
-        super().__init__(unique=unique)
+        super().__init__(unique=unique, ttl=ttl, maxSize=maxSize, fetcher=fetcher)
         self.blacklist: Iterable = list(blacklist)
         self.limit: int = limit
 
-    def extend(self, _key: Any, values: Iterable) -> CacheListProperty:
-        key: str = str(_key)
-        items = self._items.get(key, [])
+    def extend(self, key: int, values: Iterable) -> CacheListProperty:
+        items = self._peek(key)
         values = set(values)  # Remove duplicates
 
         if not values:
             self.set(key, [])
             raise ValueError("value can't be empty")
 
-        if self.limit and (len(items) + len(values)) > self.limit:
+        if self.limit and (len(items or []) + len(values)) > self.limit:
             raise CacheListFull
 
         if self.unique:
-            values = [v for v in values if v not in items or v not in self.blacklist]
+            values = [v for v in values if v not in (items or []) or v not in self.blacklist]
             if not values:
                 raise CacheUniqueViolation
 
-        try:
-            self._items[key].extend(values)
-        except KeyError:
+        if items is None:
             self.set(key, list(values))
+        else:
+            items.extend(values)
 
         return self
 
-    def add(self, _key: Any, value: Any) -> CacheListProperty:
-        key: str = str(_key)
-        items = self._items.get(key, [])
+    def add(self, key: int, value: Any) -> CacheListProperty:
+        items = self._peek(key)
 
         if not isinstance(value, int) and not value:
-            self._items[key] = []
+            self.set(key, [])
             raise ValueError("value can't be empty")
 
-        if self.limit and (len(items) + 1) > self.limit:
+        if self.limit and (len(items or []) + 1) > self.limit:
             raise CacheListFull
 
-        if self.unique and value in items:
+        if self.unique and items and value in items:
             raise CacheUniqueViolation
 
         if value in self.blacklist:
             raise CacheError(f"'{value}' is blacklisted")
 
-        try:
-            self._items[key].append(value)
-        except KeyError:
+        if items is None:
             self.set(key, [value])
+        else:
+            items.append(value)
 
         return self
 
     # Alias add as append
     append = add
 
-    def remove(self, _key: Any, value: Any) -> CacheListProperty:
-        key: str = str(_key)
-        items = self._items.get(key, [])
+    def remove(self, key: int, value: Any) -> CacheListProperty:
+        items = self._peek(key)
 
         if not value:
             raise ValueError("value can't be empty!")
@@ -240,18 +402,83 @@ class CacheListProperty(CacheProperty):
             raise IndexError("List is empty!")
 
         try:
-            self._items[key].remove(value)
+            items.remove(value)
         except ValueError:
             raise ValueError(f"'{value}' not in the list") from None
 
         return self
 
 
+class CacheSetProperty(CacheProperty):
+    """Cache Set Property, values are stored as frozenset
+
+    Writes replace the frozenset instead of mutating it, values returned to
+    callers never change under them.
+    """
+
+    def __init__(self, limit: int = 0, ttl: int = 0, maxSize: int = 0, fetcher: Fetcher | None = None) -> None:
+        super().__init__(unique=True, ttl=ttl, maxSize=maxSize, fetcher=fetcher)
+        self.limit: int = limit
+
+    def set(self, key: int, value: Iterable) -> CacheSetProperty:
+        if not isinstance(value, frozenset):
+            value = frozenset(value)
+        # Most guilds have nothing in it, share a single empty set
+        super().set(key, value or _EMPTY_SET)
+        return self
+
+    def extend(self, key: int, values: Iterable) -> CacheSetProperty:
+        items = self._peek(key, frozenset())
+        values = frozenset(values)
+
+        if not values:
+            raise ValueError("value can't be empty")
+
+        if self.limit and len(items | values) > self.limit:
+            raise CacheListFull
+
+        if values <= items:
+            raise CacheUniqueViolation
+
+        return self.set(key, items | values)
+
+    def add(self, key: int, value: Any) -> CacheSetProperty:
+        items = self._peek(key, frozenset())
+
+        if value in items:
+            raise CacheUniqueViolation
+
+        if self.limit and len(items) + 1 > self.limit:
+            raise CacheListFull
+
+        return self.set(key, items | {value})
+
+    # Alias add as append
+    append = add
+
+    def remove(self, key: int, value: Any) -> CacheSetProperty:
+        items = self._peek(key)
+
+        if not items:
+            raise IndexError("Set is empty!")
+
+        if value not in items:
+            raise ValueError(f"'{value}' not in the set")
+
+        return self.set(key, items - {value})
+
+
 class Cache:
-    """Cache manager"""
+    """Cache manager
 
-    def __init__(self):
+    `maxSize` and `ttl` are used as default for every cache property added
+    through `Cache.add`.
+    """
+
+    def __init__(self, *, maxSize: int = 0, ttl: int = 0):
         self._property: list[str] = list()
+        self.maxSize: int = maxSize
+        self.ttl: int = ttl
 
     @property
     def property(self) -> list:
@@ -266,10 +493,21 @@ class Cache:
         if not getattr(cls, "isCacheProperty", False) or isinstance(cls, CacheProperty):
             raise RuntimeError("cls has to be CacheProperty or subclass of CacheProperty")
 
-        self._property.append(name)
+        kwargs.setdefault("maxSize", self.maxSize)
+        kwargs.setdefault("ttl", self.ttl)
+
+        if name not in self._property:
+            self._property.append(name)
         setattr(self, name, cls(**kwargs))
         return self
 
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hit/miss/eviction counters of every cache property"""
+        return {name: getattr(self, name).stats for name in self._property}
+
+    def purgeExpired(self) -> int:
+        return sum(getattr(self, name).purgeExpired() for name in self._property)
+
 
 class JSON(dict):
     __slots__ = ("filename", "data")
@@ -336,17 +574,16 @@ class Blacklist(JSON):
 if __name__ == "__main__":
     # FOR TESTING ONLY
 
-    cache = Cache().add("guildConfigs", cls=CacheListProperty, unique=True)
-    cache.guildConfigs.add(0, ">").remove(0, ".")
-
-    # TODO - Better and more expandable caching system with Tortoise integration
-    # cache = Cache().add("prefix", cls=PrefixCache).add("guildConfigs", cls=GuildConfigCache)
-    #
-    # await cache.prefix.add(0, ">")
-    # await cache.prefix.fetch(0)
-    # cache.prefix.get(0)
-    #
-    # await cache.guildConfigs.set(0, "purgeCh", 69)
-    # await cache.guildConfigs.fetch(0, "purgeCh")
-    # cache.guildConfigs.get(0, "purgeCh") or 69
-    # cache.guildConfigs.get(0, "purgeCh", 69)
+    async def fetchPrefixes(guildId: int) -> list[str]:
+        await asyncio.sleep(1)  # Pretend it's a database query
+        return [">"]
+
+    async def main():
+        cache = Cache(maxSize=100, ttl=60).add("prefixes", cls=CacheListProperty, unique=True, fetcher=fetchPrefixes)
+
+        # Both of them share the same fetch
+        print(await asyncio.gather(cache.prefixes.fetch(0), cache.prefixes.fetch(0)))  # type: ignore
+        cache.prefixes.add(0, "!")  # type: ignore
+        print(cache.prefixes.get(0), cache.stats())  # type: ignore
+
+    asyncio.run(main())
@@ -58,9 +58,15 @@ class Timer(Model):
     id = NewBigIntField(pk=True)
     event = fields.TextField()
     extra = fields.JSONField()  # {"args": ..., "kwargs": ...}
-    expires = fields.DatetimeField()
+    expires = fields.DatetimeField(index=True)
     created = fields.DatetimeField()
     owner = fields.BigIntField(pk=False, generated=False)
+    # Lease of the bot process currently dispatching the timer
+    claimedBy = fields.TextField(null=True)
+    claimedUntil = fields.DatetimeField(null=True)
+
+    class Meta:
+        indexes = (("owner", "event"),)
 
 
 class Commands(Model):
@@ -86,12 +92,18 @@ class CommandsLookup(ContainsGuildId, Model):
 
     class Meta:
         table = "commandsLookup"
+        # (guild_id, name) instead of (name, guild_id), so it also covers
+        # guild_id-only lookup
+        indexes = (("guild_id", "name"), ("cmd_id",))
 
 
 class Disabled(ContainsGuildId, Model):
     id = NewIntField(pk=True)
     command = fields.TextField()
 
+    class Meta:
+        indexes = (("guild_id",),)
+
 
 class Prefixes(ContainsGuildId, Model):
     id = NewIntField(pk=True)
@@ -99,6 +111,7 @@ class Prefixes(ContainsGuildId, Model):
 
     class Meta:
         unique_together = (("prefix", "guild_id"),)
+        indexes = (("guild_id",),)
 
 
 class GuildConfigs(ContainsGuildId, Model):
@@ -111,6 +124,7 @@ class GuildConfigs(ContainsGuildId, Model):
 
     class Meta:
         table = "guildConfigs"
+        unique_together = (("guild_id",),)
 
 
 class GuildChannels(ContainsGuildId, Model):
@@ -123,6 +137,7 @@ class GuildChannels(ContainsGuildId, Model):
 
     class Meta:
         table = "guildChannels"
+        unique_together = (("guild_id",),)
 
 
 class GuildRoles(ContainsGuildId, Model):
@@ -133,6 +148,7 @@ class GuildRoles(ContainsGuildId, Model):
 
     class Meta:
         table = "guildRoles"
+        unique_together = (("guild_id",),)
 
 
 class GuildMutes(ContainsGuildId, Model):
@@ -141,6 +157,7 @@ class GuildMutes(ContainsGuildId, Model):
 
     class Meta:
         table = "guildMutes"
+        indexes = (("guild_id", "mutedId"),)
 
 
 class CaseLog(ContainsGuildId, Model):
@@ -154,9 +171,42 @@ class CaseLog(ContainsGuildId, Model):
 
     class Meta:
         table = "caseLog"
+        indexes = (("guild_id", "caseId"), ("guild_id", "modId"))
+
+
+class CaseCounter(ContainsGuildId, Model):
+    """Guild's last case number, so doCaselog doesn't need to MAX(caseId)"""
+
+    id = NewIntField(pk=True)
+    lastCaseId = fields.BigIntField(pk=False, generated=False, default=0)
+
+    class Meta:
+        table = "caseCounter"
+        unique_together = (("guild_id",),)
+
+
+class CommandUsage(Model):
+    id = NewIntField(pk=True)
+    name = fields.TextField()  # formatted command name, e.g. "command run"
+    uses = fields.BigIntField(pk=False, generated=False, default=0)
+
+    class Meta:
+        table = "commandUsage"
+        # TextField can't be unique by itself
+        unique_together = (("name",),)
 
 
 class Users(Model):
     id = fields.BigIntField(pk=True, generated=False)
     locale = fields.TextField(null=True)
     timeZone = fields.TextField(null=True)
+
+
+class SchemaFingerprint(Model):
+    id = NewIntField(pk=True)
+    fingerprint = fields.CharField(max_length=64)  # sha256 hex digest of models' schema
+    dataVersion = fields.IntField(pk=False, generated=False, default=0)  # one-time data migrations applied
+    updatedAt = fields.DatetimeField()
+
+    class Meta:
+        table = "schemaFingerprint"
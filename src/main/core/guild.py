@@ -12,6 +12,7 @@ from typing import TYPE_CHECKING, Any
 import discord
 
 from .prefix import Prefix
+from .settings import GuildSettings
 
 
 if TYPE_CHECKING:
@@ -70,9 +71,17 @@ class GuildWrapper:
     async def addPrefix(self, prefix: str):
         return await self.prefix.add(prefix)
 
+    async def getSettings(self) -> GuildSettings:
+        return await self.bot.getGuildSettings(self.id)
+
     async def getConfig(self, configType: str) -> Any:
-        # TODO: Move self.bot.getGuildConfig codes here
-        return await self.bot.getGuildConfig(self.id, configType)
+        return (await self.getSettings()).config(configType)
+
+    async def getChannel(self, channelType: str) -> int | None:
+        return (await self.getSettings()).channel(channelType)
+
+    async def getRole(self, roleType: str) -> int | None:
+        return (await self.getSettings()).role(roleType)
 
     async def getCCMode(self) -> CCMode:
-        return CCMode(await self.bot.getGuildConfig(self.id, "ccMode") or 0)
+        return CCMode((await self.getSettings()).ccMode or 0)
@@ -6,14 +6,14 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Iterable
 
 import discord
 from discord.ext import commands
 from tortoise.exceptions import IntegrityError
 
 from ..utils.format import cleanifyPrefix
-from . import db
+from . import db, queries
 from .data import CacheListFull, CacheUniqueViolation
 
 
@@ -21,7 +21,75 @@ if TYPE_CHECKING:
     from .bot import ziBot
 
 
-__all__ = ("Prefix",)
+__all__ = ("Prefix", "PrefixMatcher")
+
+
+# Priority markers, `>command` (or `!command`, `./command`) will execute custom
+# command instead of built-in command when both exists.
+# TODO: Add ability add custom priority prefix
+PRIORITY_MARKERS: tuple[str, ...] = (">", "!", "./")
+
+
+class PrefixMatcher:
+    """Compiled prefix matcher for a single guild
+
+    Prefixes are compiled into a trie so a message's prefix and its priority
+    marker can be resolved in one pass. Messages that doesn't start with any
+    prefix's first character are rejected before walking the trie.
+
+    Matches the same prefix `commands.when_mentioned_or(*sorted(prefixes))`
+    would, mentions first, then the shortest matching prefix.
+    """
+
+    __slots__ = ("prefixes", "_root", "_firstChars")
+
+    def __init__(self, defaultPrefix: str, prefixes: Iterable[str], userId: int) -> None:
+        mentions = (f"<@{userId}> ", f"<@!{userId}> ")
+        self.prefixes: tuple[str, ...] = mentions + tuple(sorted({defaultPrefix, *prefixes}))
+
+        # char -> node, node[None] = (rank, prefix), lower rank wins
+        self._root: dict[Any, Any] = {}
+        for prefix in self.prefixes:
+            node = self._root
+            for char in prefix:
+                node = node.setdefault(char, {})
+            rank = 0 if prefix in mentions else 1
+            if None not in node:
+                node[None] = (rank, prefix)
+
+        self._firstChars: frozenset[str] = frozenset(self._root)
+
+    def __repr__(self) -> str:
+        return f"<PrefixMatcher: prefixes={self.prefixes}>"
+
+    def match(self, content: str) -> tuple[str, str] | None:
+        """Get (prefix, priority marker) of a message's content, return None
+        when the message doesn't start with any of the prefixes"""
+        if not content or content[0] not in self._firstChars:
+            return None
+
+        node = self._root
+        found = None
+        for char in content:
+            node = node.get(char)
+            if node is None:
+                break
+
+            terminal = node.get(None)
+            if terminal is not None and (found is None or terminal[0] < found[0]):
+                found = terminal
+                if found[0] == 0:
+                    break
+
+        if found is None:
+            return None
+
+        prefix = found[1]
+        start = len(prefix)
+        for marker in PRIORITY_MARKERS:
+            if content.startswith(marker, start):
+                return prefix, marker
+        return prefix, ""
 
 
 class Prefix:
@@ -34,17 +102,13 @@ class Prefix:
             return await db.Prefixes.filter(guild_id=self.owner.id)
         return []
 
-    async def get(self) -> list[str]:
-        if self.bot.cache.prefixes.get(self.owner.id) is None:  # type: ignore
-            # Only executed when there's no cache for guild's prefix
-            dbPrefixes = await self.fetch()
+    @staticmethod
+    async def fetchPrefixes(guildId: int) -> list[str]:
+        """Fetcher for `bot.cache.prefixes`"""
+        return list(await queries.fetchPrefixes(guildId))
 
-            try:
-                self.bot.cache.prefixes.extend(self.owner.id, [p.prefix for p in dbPrefixes])  # type: ignore
-            except ValueError:
-                return []
-
-        return self.bot.cache.prefixes[self.owner.id]  # type: ignore
+    async def get(self) -> list[str]:
+        return await self.bot.cache.prefixes.fetch(self.owner.id)  # type: ignore
 
     async def getFormatted(self) -> str:
         _prefixes = await self.get()
@@ -64,17 +128,17 @@ class Prefix:
         return result
 
     async def add(self, prefix: str) -> str:
-        prefixes = await self.fetch()
+        prefixes = await self.get()
 
         try:
-            if prefixes and (len(prefixes) + 1) > self.bot.cache.prefixes.limit:  # type: ignore
+            if prefix in prefixes:
+                raise CacheUniqueViolation
+
+            if (len(prefixes) + 1) > self.bot.cache.prefixes.limit:  # type: ignore
                 raise CacheListFull
 
             await db.Prefixes.create(prefix=prefix, guild_id=self.owner.id)
-            self.bot.cache.prefixes.add(self.owner.id, prefix)  # type: ignore
-        except (CacheUniqueViolation, IntegrityError) as exc:
-            if exc is IntegrityError:
-                self.bot.cache.prefixes.remove(self.owner.id, prefix)  # type: ignore
+        except (CacheUniqueViolation, IntegrityError):
             raise commands.BadArgument("Prefix `{}` is already exists".format(self.cleanify(prefix)))
         except CacheListFull:
             raise IndexError(
@@ -83,18 +147,19 @@ class Prefix:
                 )
             )
 
+        # Cached prefixes may be evicted while writing, so reload them from
+        # database instead of modifying them
+        self.bot.invalidateCache("prefixes", self.owner.id)
+        await self.bot.publishCacheInvalidation("prefixes", self.owner.id)
         return prefix
 
     async def remove(self, prefix: str) -> str:
-        try:
-            res = [await i.delete() for i in await db.Prefixes.filter(prefix=prefix, guild_id=self.owner.id)]
-            if not res:
-                raise IndexError
-
-            self.bot.cache.prefixes.remove(self.owner.id, prefix)  # type: ignore
-        except IndexError:
+        deleted = await db.Prefixes.filter(prefix=prefix, guild_id=self.owner.id).delete()
+        if not deleted:
             raise commands.BadArgument("Prefix `{}` is not exists".format(self.cleanify(prefix)))
 
+        self.bot.invalidateCache("prefixes", self.owner.id)
+        await self.bot.publishCacheInvalidation("prefixes", self.owner.id)
         return prefix
 
     def cleanify(self, prefix: str) -> str:
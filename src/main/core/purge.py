@@ -0,0 +1,164 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Iterable
+
+from tortoise.exceptions import BaseORMException
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from . import db
+
+
+__all__ = ("GuildPurger",)
+
+
+# Tables with guild_id column, purged in this order after custom commands and
+# before the guild itself
+GUILD_TABLES: tuple[type[Model], ...] = (
+    db.Disabled,
+    db.Prefixes,
+    db.GuildConfigs,
+    db.GuildChannels,
+    db.GuildRoles,
+    db.GuildMutes,
+    db.CaseLog,
+    db.CaseCounter,
+)
+
+
+def _chunks(ids: list[int], size: int) -> Iterable[list[int]]:
+    for i in range(0, len(ids), size):
+        yield ids[i : i + size]
+
+
+class GuildPurger:
+    """Background job that deletes data of guilds the bot left
+
+    Guilds are purged one at a time from a queue, so mass leave doesn't flood
+    the database. Each guild is purged inside a single transaction with one
+    bulk delete per table (children first), then the job sleeps for `pause`
+    seconds for every `largePurge` rows deleted to give live traffic room.
+    """
+
+    def __init__(
+        self,
+        pause: float = 1.0,
+        largePurge: int = 10_000,
+        chunkSize: int = 500,
+        onPurged: Callable[[int], Awaitable[None]] | None = None,
+    ) -> None:
+        self.logger: logging.Logger = logging.getLogger("discord")
+        self.pause: float = pause
+        self.largePurge: int = largePurge
+        self.chunkSize: int = chunkSize
+        # Called with guild id after its data is deleted
+        self.onPurged: Callable[[int], Awaitable[None]] | None = onPurged
+
+        # Preserve insertion order, guild removed from here before its turn is skipped
+        self.pending: dict[int, None] = {}
+
+        # Metrics
+        self.purged: int = 0
+        self.failed: int = 0
+        self.rows: Counter[str] = Counter()
+        self.elapsed: float = 0.0
+
+        self._wakeUp: asyncio.Event = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __repr__(self) -> str:
+        return f"<GuildPurger: pending={len(self.pending)} purged={self.purged}>"
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": len(self.pending),
+            "purged": self.purged,
+            "failed": self.failed,
+            "rows": dict(self.rows),
+            "elapsed": round(self.elapsed, 3),
+        }
+
+    def schedule(self, guildId: int) -> None:
+        """Queue guild for purging"""
+        self.pending[guildId] = None
+        self._wakeUp.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+
+    def cancel(self, guildId: int) -> bool:
+        """Remove guild from the queue (e.g. the bot rejoined), returns whether
+        it was queued"""
+        if guildId not in self.pending:
+            return False
+        del self.pending[guildId]
+        return True
+
+    async def close(self) -> None:
+        # Queued guilds still have their row in guilds table, so they'll be
+        # scheduled for deletion again on the next boot
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def _worker(self) -> None:
+        while True:
+            if not self.pending:
+                self._wakeUp.clear()
+                await self._wakeUp.wait()
+                continue
+
+            guildId = next(iter(self.pending))
+            del self.pending[guildId]
+
+            try:
+                deleted = await self.purge(guildId)
+            except BaseORMException as err:
+                self.failed += 1
+                self.logger.warning(f"Failed to purge guild {guildId}: {err}")
+                continue
+
+            if self.onPurged:
+                await self.onPurged(guildId)
+
+            total = sum(deleted.values())
+            if total >= self.largePurge:
+                await asyncio.sleep(self.pause * (total // self.largePurge))
+
+    async def purge(self, guildId: int) -> Counter[str]:
+        """|coro|
+
+        Delete every row belonging to a guild in a single transaction, returns
+        how many rows deleted per table.
+        """
+        start = time.perf_counter()
+        deleted: Counter[str] = Counter()
+
+        async with in_transaction():
+            # Custom commands only linked to guild through commandsLookup
+            cmdIds = list(await db.CommandsLookup.filter(guild_id=guildId).distinct().values_list("cmd_id", flat=True))
+            deleted["commandsLookup"] = await db.CommandsLookup.filter(guild_id=guildId).delete()
+            for chunk in _chunks(cmdIds, self.chunkSize):  # type: ignore
+                deleted["commands"] += await db.Commands.filter(id__in=chunk).delete()
+
+            for model in GUILD_TABLES:
+                deleted[model._meta.db_table] = await model.filter(guild_id=guildId).delete()
+
+            deleted["guilds"] = await db.Guilds.filter(id=guildId).delete()
+
+        elapsed = time.perf_counter() - start
+
+        deleted = +deleted  # drop tables without any rows
+        self.purged += 1
+        self.rows.update(deleted)
+        self.elapsed += elapsed
+        self.logger.info(f"Purged guild {guildId}: {sum(deleted.values())} rows in {elapsed:.2f}s ({dict(deleted)})")
+        return deleted
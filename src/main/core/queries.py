@@ -0,0 +1,124 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from pypika import Parameter, Table
+from pypika.queries import Query, QueryBuilder
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.models import Model
+
+from . import db
+
+
+__all__ = (
+    "CustomCommandRow",
+    "RawQuery",
+    "fetchCustomCommands",
+    "fetchDisabledCommands",
+    "fetchGuildMutes",
+    "fetchPrefixes",
+)
+
+
+# (name, cmd_id, cmd name, content, description, category, uses, url, ownerId, enabled)
+CustomCommandRow = tuple[str, int, str, str, str | None, str, int, str | None, int, bool]
+
+
+class RawQuery:
+    """Parameterized SQL for hot-path reads, bypassing TortoiseORM's model
+    instantiation
+
+    SQL is built with the connection's own query builder (quoting and
+    parameter placeholder differs between SQLite, PostgreSQL and MySQL) the
+    first time it's executed on a dialect, then reused. Rows are returned as
+    plain tuples.
+    """
+
+    __slots__ = ("model", "build", "_sql")
+
+    def __init__(
+        self, model: type[Model], build: Callable[[QueryBuilder, Table, Callable[[int], Parameter]], QueryBuilder]
+    ) -> None:
+        # Model whose connection the query runs on
+        self.model: type[Model] = model
+        # (query, table, parameter) -> query
+        self.build = build
+        # executor class -> SQL
+        self._sql: dict[type, str] = {}
+
+    def sql(self, connection: BaseDBAsyncClient) -> str:
+        executor = connection.executor_class
+        sql = self._sql.get(executor)
+        if sql is None:
+            queryClass: type[Query] = connection.query_class
+            table = Table(self.model._meta.db_table)
+            # Only depends on the dialect, doesn't need an actual executor
+            parameter = lambda pos: executor.parameter(None, pos)  # type: ignore # noqa: E731
+            sql = self._sql[executor] = self.build(queryClass.from_(table), table, parameter).get_sql()
+        return sql
+
+    async def fetch(self, *values: Any) -> list[tuple]:
+        connection = self.model._meta.db
+        _, rows = await connection.execute_query(self.sql(connection), list(values))
+        # MySQL client returns dicts, SQLite and asyncpg returns tuple-like rows
+        return [tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in rows]
+
+    async def fetchColumn(self, *values: Any) -> tuple:
+        """Fetch the first column of every row"""
+        connection = self.model._meta.db
+        _, rows = await connection.execute_query(self.sql(connection), list(values))
+        if rows and isinstance(rows[0], dict):
+            return tuple(next(iter(row.values())) for row in rows)
+        return tuple(row[0] for row in rows)
+
+
+_PREFIXES = RawQuery(db.Prefixes, lambda q, t, p: q.select(t.prefix).where(t.guild_id == p(0)))
+_DISABLED = RawQuery(db.Disabled, lambda q, t, p: q.select(t.command).where(t.guild_id == p(0)))
+_MUTES = RawQuery(db.GuildMutes, lambda q, t, p: q.select(t.mutedId).where(t.guild_id == p(0)))
+
+
+def _buildCustomCommands(q: QueryBuilder, t: Table, p: Callable[[int], Parameter]) -> QueryBuilder:
+    cmd = Table(db.Commands._meta.db_table)
+    return (
+        q.join(cmd)
+        .on(cmd.id == t.cmd_id)
+        .select(
+            t.name,
+            t.cmd_id,
+            # Aliased, MySQL client returns rows as dict keyed by column name
+            *(
+                getattr(cmd, col).as_(f"cmd__{col}")
+                for col in ("name", "content", "description", "category", "uses", "url", "ownerId", "enabled")
+            ),
+        )
+        .where(t.guild_id == p(0))
+    )
+
+
+_CUSTOM_COMMANDS = RawQuery(db.CommandsLookup, _buildCustomCommands)
+
+
+async def fetchPrefixes(guildId: int) -> tuple[str, ...]:
+    return await _PREFIXES.fetchColumn(guildId)
+
+
+async def fetchDisabledCommands(guildId: int) -> tuple[str, ...]:
+    return await _DISABLED.fetchColumn(guildId)
+
+
+async def fetchGuildMutes(guildId: int) -> tuple[int, ...]:
+    return await _MUTES.fetchColumn(guildId)
+
+
+async def fetchCustomCommands(guildId: int) -> list[CustomCommandRow]:
+    """Guild's custom commands joined with their names and aliases, one row
+    per name"""
+    rows = await _CUSTOM_COMMANDS.fetch(guildId)
+    # SQLite and MySQL stores boolean as integer
+    return [(*row[:-1], bool(row[-1])) for row in rows]  # type: ignore
@@ -0,0 +1,154 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+
+__all__ = ("CommandQueries", "QueryStats", "currentCommand")
+
+
+# Methods every query goes through
+QUERY_METHODS = ("execute_insert", "execute_query", "execute_query_dict", "execute_many", "execute_script")
+
+
+class CommandQueries:
+    """Queries made by a single command invocation"""
+
+    __slots__ = ("name", "guildId", "queries", "elapsed")
+
+    def __init__(self, name: str, guildId: int | None) -> None:
+        self.name: str = name
+        self.guildId: int | None = guildId
+        self.queries: int = 0
+        self.elapsed: float = 0.0  # in seconds
+
+    def __repr__(self) -> str:
+        return f"<CommandQueries: name={self.name!r} queries={self.queries} elapsed={self.elapsed:.3f}>"
+
+
+# Command currently running in this context (task)
+currentCommand: ContextVar[CommandQueries | None] = ContextVar("currentCommand", default=None)
+# Whether we're already inside an instrumented method (some clients call
+# their own execute_query from execute_query_dict), so it's only counted once
+_inQuery: ContextVar[bool] = ContextVar("_inQuery", default=False)
+
+
+class QueryStats:
+    """Per-command database query accounting
+
+    Tortoise's connection clients are instrumented to count queries and their
+    time against the command set in `currentCommand`, queries slower than
+    `threshold` seconds are logged.
+    """
+
+    def __init__(self, threshold: float = 0.25) -> None:
+        self.logger: logging.Logger = logging.getLogger("discord")
+        self.threshold: float = threshold
+
+        # command name -> [runs, queries, elapsed, max queries in a single run]
+        self.commands: dict[str, list[Any]] = {}
+        self.slowQueries: int = 0
+
+    def __repr__(self) -> str:
+        return f"<QueryStats: commands={len(self.commands)} slowQueries={self.slowQueries}>"
+
+    def instrument(self, connection: BaseDBAsyncClient) -> None:
+        """Instrument connection's client class (and its transaction class)"""
+        classes = [type(connection)]
+        trxClass = getattr(sys.modules[type(connection).__module__], "TransactionWrapper", None)
+        if trxClass:
+            classes.append(trxClass)
+
+        for cls in classes:
+            for name in QUERY_METHODS:
+                method = getattr(cls, name, None)
+                if method is None or getattr(method, "__queryStats__", None) is self:
+                    continue
+                if hasattr(method, "__queryStats__"):
+                    # Instrumented by another instance (e.g. bot got restarted), replace it
+                    method = method.__wrapped__
+                setattr(cls, name, self._wrap(method))
+
+    def _wrap(self, method: Callable) -> Callable:
+        @functools.wraps(method)
+        async def wrapper(client: BaseDBAsyncClient, query: str, *args, **kwargs):
+            if _inQuery.get():
+                return await method(client, query, *args, **kwargs)
+
+            token = _inQuery.set(True)
+            start = time.perf_counter()
+            try:
+                return await method(client, query, *args, **kwargs)
+            finally:
+                _inQuery.reset(token)
+                self.record(query, time.perf_counter() - start)
+
+        wrapper.__queryStats__ = self  # type: ignore
+        return wrapper
+
+    def record(self, query: str, elapsed: float) -> None:
+        cmd = currentCommand.get()
+        if cmd:
+            cmd.queries += 1
+            cmd.elapsed += elapsed
+
+        if self.threshold and elapsed >= self.threshold:
+            self.slowQueries += 1
+            self.logger.warning(
+                "Slow query ({:.3f}s) from {}: {}".format(
+                    elapsed,
+                    f"command '{cmd.name}' in guild {cmd.guildId}" if cmd else "outside of command",
+                    query if len(query) <= 500 else query[:500] + "...",
+                )
+            )
+
+    def end(self, cmd: CommandQueries | None = None) -> CommandQueries | None:
+        """Add command's queries to the aggregates"""
+        cmd = cmd or currentCommand.get()
+        if not cmd:
+            return None
+
+        stats = self.commands.setdefault(cmd.name, [0, 0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += cmd.queries
+        stats[2] += cmd.elapsed
+        stats[3] = max(stats[3], cmd.queries)
+        return cmd
+
+    @contextmanager
+    def track(self, name: str, guildId: int | None) -> Iterator[CommandQueries]:
+        cmd = CommandQueries(name, guildId)
+        token = currentCommand.set(cmd)
+        try:
+            yield cmd
+        finally:
+            currentCommand.reset(token)
+            self.end(cmd)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "slowQueries": self.slowQueries,
+            "commands": {
+                name: {
+                    "runs": runs,
+                    "queries": queries,
+                    "avgQueries": round(queries / runs, 2),
+                    "maxQueries": maxQueries,
+                    "elapsed": round(elapsed, 3),
+                }
+                for name, (runs, queries, elapsed, maxQueries) in self.commands.items()
+            },
+        }
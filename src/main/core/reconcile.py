@@ -0,0 +1,86 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import datetime
+import time
+from collections import defaultdict
+from typing import Iterable, NamedTuple
+
+from tortoise.transactions import in_transaction
+
+from ..utils import utcnow
+from . import db
+
+
+__all__ = ("ReconcileResult", "reconcileGuilds")
+
+
+class ReconcileResult(NamedTuple):
+    inserted: int  # new guilds added to guilds table
+    scheduled: int  # guilds scheduled for deletion
+    cancelled: frozenset[int]  # guilds whose deletion got cancelled
+    expires: datetime.datetime  # when the newly scheduled deletion expires
+    elapsed: float  # in seconds
+
+
+def _chunks(ids: list[int], size: int) -> Iterable[list[int]]:
+    for i in range(0, len(ids), size):
+        yield ids[i : i + size]
+
+
+async def reconcileGuilds(guildIds: Iterable[int], days: int = 30, chunkSize: int = 500) -> ReconcileResult:
+    """|coro|
+
+    Sync guilds table with guilds the bot is currently in:
+
+    - Guilds the bot is in but not in the table are inserted
+    - Guilds pending deletion that the bot rejoined get their deletion cancelled
+    - Guilds the bot no longer in are scheduled for deletion in `days` days
+
+    Everything is computed with set differences, writes are done in chunks
+    of `chunkSize` rows (also keeps `id__in` under SQLite's variable limit).
+    """
+    start = time.perf_counter()
+
+    current = set(guildIds)
+    known = set(await db.Guilds.all().values_list("id", flat=True))
+    # owner -> timer ids, a guild may have more than one deletion timer
+    scheduled: defaultdict[int, list[int]] = defaultdict(list)
+    for owner, timerId in await db.Timer.filter(event="guild_del").values_list("owner", "id"):
+        scheduled[owner].append(timerId)
+
+    newGuilds = sorted(current - known)
+    cancelled = scheduled.keys() & current
+    toSchedule = sorted(known - current - scheduled.keys())
+
+    now = utcnow()
+    when = now + datetime.timedelta(days=days)
+
+    async with in_transaction():
+        for chunk in _chunks(newGuilds, chunkSize):
+            await db.Guilds.bulk_create([db.Guilds(id=i) for i in chunk])
+
+        for chunk in _chunks(sorted(timerId for i in cancelled for timerId in scheduled[i]), chunkSize):
+            await db.Timer.filter(id__in=chunk).delete()
+
+        for chunk in _chunks(toSchedule, chunkSize):
+            await db.Timer.bulk_create(
+                [
+                    db.Timer(
+                        id=i,
+                        event="guild_del",
+                        extra={"args": [], "kwargs": {}},
+                        expires=when,
+                        created=now,
+                        owner=i,
+                    )
+                    for i in chunk
+                ]
+            )
+
+    return ReconcileResult(len(newGuilds), len(toSchedule), frozenset(cancelled), when, time.perf_counter() - start)
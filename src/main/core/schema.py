@@ -0,0 +1,184 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from aerich import Command as AerichCommand
+from aerich.ddl.sqlite import SqliteDDL
+from tortoise import Tortoise
+from tortoise.exceptions import OperationalError
+
+from ..utils import backfillCaseCounters, utcnow
+from . import db
+from .config import Config
+from .settings import compactGuildSettings
+from .usage import compactCommandUsage
+
+
+__all__ = ("DATA_MIGRATIONS", "ensureSchema", "migrateDatabase", "schemaFingerprint")
+
+
+MIGRATION_DIR = Path("migrations")
+
+# One-time data migrations, applied in order by `migrateDatabase` and only
+# once (how many applied is stored in schemaFingerprint.dataVersion).
+# (log message, coroutine function returning affected rows, run before
+# schema upgrade e.g. to clean up data for a new constraint)
+DATA_MIGRATIONS: list[tuple[str, Callable[[], Awaitable[int]], bool]] = [
+    # Duplicates would fail guild settings' unique guild_id
+    ("Removed {} duplicate guild settings rows", compactGuildSettings, True),
+    # Guilds with cases logged before case counters existed
+    ("Created case counter for {} guilds", backfillCaseCounters, False),
+    # Duplicates would fail command usage's unique name
+    ("Removed {} duplicate command usage rows", compactCommandUsage, True),
+]
+
+
+def schemaFingerprint() -> str:
+    """Hash of every model's schema in core/db.py, Tortoise need to be
+    initialized"""
+    models = sorted(
+        (model for model in Tortoise.apps["models"].values() if model.__module__ == db.__name__),
+        key=lambda model: model._meta.db_table,
+    )
+    described = Tortoise.describe_models(models)  # type: ignore
+    return hashlib.sha256(json.dumps(described, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def storedFingerprint() -> str | None:
+    try:
+        # Only the needed column, the table may be missing newer columns
+        fingerprints = await db.SchemaFingerprint.filter(id=1).values_list("fingerprint", flat=True)
+    except OperationalError:
+        # Table doesn't exist yet
+        return None
+    return fingerprints[0] if fingerprints else None  # type: ignore
+
+
+async def storedDataVersion() -> int:
+    try:
+        versions = await db.SchemaFingerprint.filter(id=1).values_list("dataVersion", flat=True)
+    except OperationalError:
+        # Table or column doesn't exist yet
+        return 0
+    version = versions[0] if versions else 0
+    # SQLite treats unknown quoted column as a string literal instead of failing
+    return version if isinstance(version, int) else 0
+
+
+async def _migrateData(applied: int, beforeUpgrade: bool) -> None:
+    logger = logging.getLogger("discord")
+    for message, migration, before in DATA_MIGRATIONS[applied:]:
+        if before != beforeUpgrade:
+            continue
+
+        try:
+            affected = await migration()
+        except OperationalError:
+            if not beforeUpgrade:
+                raise
+            # Fresh database, tables aren't created yet so there's nothing to migrate
+            continue
+
+        if affected:
+            logger.warning(message.format(affected))
+
+
+def _cleanMigrationDir(directory: Path):
+    for filename in os.listdir(directory):
+        filePath = directory / filename
+        try:
+            if os.path.isfile(filePath) or os.path.islink(filePath):
+                os.unlink(filePath)
+            elif os.path.isdir(filePath):
+                shutil.rmtree(filePath)
+        except Exception as err:
+            print(f"Failed to delete {filePath}. Reason: {err}")
+
+
+async def _initTortoise(config: Config) -> None:
+    if not Tortoise._inited or not Tortoise.apps:
+        # Not initialized yet (or dropped by tests)
+        await Tortoise.init(config=config.tortoiseConfig)
+
+
+def _patchSqliteDDL() -> None:
+    """Work around aerich 0.7.1's SqliteDDL inheriting MySQL's index templates
+    (`ALTER TABLE ... ADD INDEX`), which SQLite rejects on every index change.
+    Uses the same statements as PostgreSQL instead."""
+    SqliteDDL._ADD_INDEX_TEMPLATE = 'CREATE {unique}INDEX "{index_name}" ON "{table_name}" ({column_names})'
+    SqliteDDL._DROP_INDEX_TEMPLATE = 'DROP INDEX IF EXISTS "{index_name}"'
+
+
+async def migrateDatabase(config: Config) -> None:
+    """|coro|
+
+    Diff models against aerich's migration history, apply the upgrades, then
+    create missing tables and store the new schema fingerprint. Pending data
+    migrations are applied around the schema upgrade.
+    """
+    logger = logging.getLogger("discord")
+
+    await _initTortoise(config)
+    dataVersion = await storedDataVersion()
+    await _migrateData(dataVersion, beforeUpgrade=True)
+
+    _patchSqliteDDL()
+    aerichCmd = AerichCommand(
+        tortoise_config=config.tortoiseConfig,
+        location=str(MIGRATION_DIR),
+    )
+
+    if MIGRATION_DIR.exists():
+        await aerichCmd.init()
+
+        try:
+            update = await aerichCmd.migrate()
+
+            if update:
+                upgrades = await aerichCmd.upgrade()
+                if len(upgrades) > 0:
+                    logger.warning(f"DB Upgrades done ({len(upgrades)}): {', '.join(upgrades)}")
+
+        except AttributeError:
+            logger.warning("Unable to retrieve model history from the database! " "Creating model history from scratch...")
+
+            _cleanMigrationDir(MIGRATION_DIR)
+
+            await aerichCmd.init_db(True)
+    else:
+        await aerichCmd.init_db(True)
+
+    await Tortoise.generate_schemas(safe=True)
+
+    await _migrateData(dataVersion, beforeUpgrade=False)
+
+    await db.SchemaFingerprint.update_or_create(
+        {"fingerprint": schemaFingerprint(), "dataVersion": len(DATA_MIGRATIONS), "updatedAt": utcnow()}, id=1
+    )
+
+
+async def ensureSchema(config: Config) -> bool:
+    """|coro|
+
+    Migrate database only if models changed or there are pending data
+    migrations since the last migration, returns whether migration ran.
+    """
+    await _initTortoise(config)
+
+    if await storedFingerprint() == schemaFingerprint() and await storedDataVersion() >= len(DATA_MIGRATIONS):
+        return False
+
+    await migrateDatabase(config)
+    return True
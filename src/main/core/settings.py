@@ -0,0 +1,277 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from itertools import chain
+from typing import Any, Awaitable, Callable
+
+from tortoise.exceptions import BaseORMException
+from tortoise.functions import Count
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from . import db
+
+
+__all__ = ("GuildSettings", "GuildSettingsStore", "compactGuildSettings")
+
+
+def _relationName(model: type[Model]) -> str:
+    """Name of guilds table's reverse relation to `model` (e.g. guildConfigss)"""
+    meta = db.Guilds._meta
+    for name in meta.backward_fk_fields:
+        if meta.fields_map[name].related_model is model:
+            return name
+    raise RuntimeError(f"{model.__name__} has no relation to guilds table")
+
+
+class GuildSettings:
+    """Guild's settings from guildConfigs, guildChannels and guildRoles table
+
+    Slotted, one object per guild instead of one dict per table per guild.
+    Unset settings (including settings of a guild that has no row) are None.
+    """
+
+    # table name -> columns
+    TABLES: dict[str, tuple[str, ...]] = {
+        "guildConfigs": ("ccMode", "tagMode", "welcomeMsg", "farewellMsg", "locale"),
+        "guildChannels": ("welcomeCh", "farewellCh", "modlogCh", "purgatoryCh", "announcementCh"),
+        "guildRoles": ("modRole", "mutedRole", "autoRole"),
+    }
+    MODELS: dict[str, type[Model]] = {
+        "guildConfigs": db.GuildConfigs,
+        "guildChannels": db.GuildChannels,
+        "guildRoles": db.GuildRoles,
+    }
+
+    __slots__ = tuple(chain.from_iterable(TABLES.values()))
+
+    # guildConfigs
+    ccMode: int | None
+    tagMode: int | None
+    welcomeMsg: str | None
+    farewellMsg: str | None
+    locale: str | None
+    # guildChannels
+    welcomeCh: int | None
+    farewellCh: int | None
+    modlogCh: int | None
+    purgatoryCh: int | None
+    announcementCh: int | None
+    # guildRoles
+    modRole: int | None
+    mutedRole: int | None
+    autoRole: int | None
+
+    FIELDS: frozenset[str] = frozenset(__slots__)
+
+    def __init__(self, **kwargs: Any) -> None:
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.update(kwargs)
+
+    def __repr__(self) -> str:
+        return "<GuildSettings: {}>".format(
+            " ".join(f"{k}={v!r}" for k in self.__slots__ if (v := getattr(self, k)) is not None)
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GuildSettings):
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    @classmethod
+    async def fetch(cls, guildId: int) -> GuildSettings:
+        """Fetcher for `bot.cache.guildSettings`"""
+        return (await cls.fetchMany([guildId]))[guildId]
+
+    @classmethod
+    async def fetchMany(cls, guildIds: list[int]) -> dict[int, GuildSettings]:
+        """Load settings of multiple guilds in one round trip, every table is
+        LEFT JOIN-ed to guilds table"""
+        # guild's reverse relation name -> columns
+        relations = {_relationName(model): cls.TABLES[table] for table, model in cls.MODELS.items()}
+        fields = [f"{rel}__{col}" for rel, cols in relations.items() for col in cols]
+
+        # Same as `.first()`, first row of each table wins
+        rows = (
+            await db.Guilds.filter(id__in=guildIds)
+            .order_by("id", *(f"{rel}__id" for rel in relations))
+            .values("id", *fields)
+        )
+
+        ret = {guildId: cls() for guildId in guildIds}
+        loaded = set()
+        for row in rows:
+            guildId = row.pop("id")
+            if guildId in loaded:
+                continue
+            loaded.add(guildId)
+            ret[guildId].update({key.split("__", 1)[1]: value for key, value in row.items()})
+        return ret
+
+    def get(self, name: str, fallback: Any = None) -> Any:
+        if name not in self.FIELDS:
+            return fallback
+        return getattr(self, name)
+
+    def update(self, values: dict[str, Any]) -> None:
+        """Update settings, unknown keys (e.g. id, guild_id) are ignored"""
+        for name, value in values.items():
+            if name in self.FIELDS:
+                setattr(self, name, value)
+
+    def config(self, name: str) -> Any:
+        """Get setting from guildConfigs table"""
+        return self.get(name) if name in self.TABLES["guildConfigs"] else None
+
+    def channel(self, name: str) -> int | None:
+        """Get channel id from guildChannels table"""
+        return self.get(name) if name in self.TABLES["guildChannels"] else None
+
+    def role(self, name: str) -> int | None:
+        """Get role id from guildRoles table"""
+        return self.get(name) if name in self.TABLES["guildRoles"] else None
+
+    def asDict(self, table: str) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.TABLES[table]}
+
+
+class GuildSettingsStore:
+    """Write-behind store for guild settings, keeps one row per guild per
+    table
+
+    Changes made within `delay` seconds are merged and written together as a
+    single upsert per guild per table.
+    """
+
+    def __init__(self, delay: float = 2.0, onWritten: Callable[[int], Awaitable[None]] | None = None) -> None:
+        self.logger: logging.Logger = logging.getLogger("discord")
+        self.delay: float = delay
+        # Called with guild id after its settings are written to database
+        self.onWritten: Callable[[int], Awaitable[None]] | None = onWritten
+
+        # (table, guildId) -> changed columns
+        self.pending: dict[tuple[str, int], dict[str, Any]] = {}
+        # Changes being written, until they're committed
+        self.writing: dict[tuple[str, int], dict[str, Any]] = {}
+
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def __repr__(self) -> str:
+        return f"<GuildSettingsStore: pending={len(self.pending)}>"
+
+    async def fetch(self, guildId: int) -> GuildSettings:
+        """Fetcher for `bot.cache.guildSettings`, includes changes that haven't
+        been written yet"""
+        settings = await GuildSettings.fetch(guildId)
+        for table in GuildSettings.TABLES:
+            settings.update(self.writing.get((table, guildId), {}))
+            settings.update(self.pending.get((table, guildId), {}))
+        return settings
+
+    def set(self, guildId: int, table: str, values: dict[str, Any]) -> None:
+        """Queue settings change, written to database `delay` seconds later"""
+        unknown = set(values) - set(GuildSettings.TABLES[table])
+        if unknown:
+            raise ValueError(f"Unknown {table} column(s): {', '.join(unknown)}")
+
+        self.pending.setdefault((table, guildId), {}).update(values)
+        self._schedule()
+
+    def _schedule(self) -> None:
+        # Flush runs inside the scheduled task, which isn't done until it returns
+        if self._task is None or self._task.done() or self._task is asyncio.current_task():
+            self._task = asyncio.create_task(self._flushLater())
+
+    async def _flushLater(self) -> None:
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    async def _cancel(self) -> None:
+        # Not while it's writing, cancelling inside a transaction leaks its lock
+        async with self._lock:
+            if self._task and not self._task.done():
+                self._task.cancel()
+
+    async def close(self) -> None:
+        await self._cancel()
+        await self.flush()
+        # Don't keep retrying a failed write after closing
+        await self._cancel()
+
+    async def flush(self) -> None:
+        """Write pending changes to database"""
+        async with self._lock:
+            if not self.pending:
+                return
+
+            # Still visible to `fetch` while being written
+            pending = self.writing = self.pending
+            self.pending = {}
+
+            try:
+                async with in_transaction():
+                    for (table, guildId), values in pending.items():
+                        model = GuildSettings.MODELS[table]
+                        # INSERT ... ON CONFLICT (guild_id) DO UPDATE, only the changed columns
+                        await model.bulk_create(
+                            [model(guild_id=guildId, **values)], on_conflict=["guild_id"], update_fields=list(values)
+                        )
+            except BaseORMException as err:
+                # Put them back (newer changes win), retried `delay` seconds later
+                for key, values in pending.items():
+                    self.pending[key] = values | self.pending.get(key, {})
+                self.logger.warning(f"Failed to write guild settings: {err}")
+                self._schedule()
+                return
+            finally:
+                self.writing = {}
+
+        if self.onWritten:
+            for guildId in {guildId for _, guildId in pending}:
+                await self.onWritten(guildId)
+
+
+async def compactGuildSettings() -> int:
+    """|coro|
+
+    Collapse duplicate guild settings rows (created by older versions that
+    insert a new row on every change) into a single row. Returns how many
+    rows removed.
+
+    One-time data migration, must run before guild_id's unique constraint is
+    added.
+
+    Rows are merged by id, for each column the latest non-default value wins.
+    """
+    removed = 0
+    for table, columns in GuildSettings.TABLES.items():
+        model = GuildSettings.MODELS[table]
+        defaults = {col: model._meta.fields_map[col].default for col in columns}
+
+        guildIds = (
+            await model.annotate(count=Count("id"))
+            .group_by("guild_id")
+            .filter(count__gt=1)
+            .values_list("guild_id", flat=True)
+        )
+        for guildId in guildIds:
+            rows = await model.filter(guild_id=guildId).order_by("id").values("id", *columns)
+
+            merged = {col: rows[0][col] for col in columns}
+            for row in rows[1:]:
+                merged.update({col: row[col] for col in columns if row[col] != defaults[col]})
+
+            async with in_transaction():
+                await model.filter(id=rows[0]["id"]).update(**merged)
+                removed += await model.filter(id__in=[row["id"] for row in rows[1:]]).delete()
+
+    return removed
@@ -0,0 +1,149 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter, defaultdict
+
+from discord.ext import tasks
+from tortoise.exceptions import BaseORMException
+from tortoise.expressions import F
+from tortoise.functions import Count, Sum
+from tortoise.transactions import in_transaction
+
+from . import db
+
+
+__all__ = ("UsageCounter", "compactCommandUsage")
+
+
+class UsageCounter:
+    """Write-behind usage counter for built-in and custom commands
+
+    Increments are accumulated in memory and flushed to the database in
+    batches (every `interval` seconds and on shutdown) using atomic
+    `uses = uses + n` updates, so invoking a command never waits for a DB
+    write.
+    """
+
+    def __init__(self, interval: float = 60.0) -> None:
+        self.logger: logging.Logger = logging.getLogger("discord")
+
+        # Totals, loaded from database on boot and updated on every increment
+        self.commands: Counter[str] = Counter()
+        self.customCommands: int = 0
+
+        # Increments that haven't been written to the database yet
+        self.pendingCommands: Counter[str] = Counter()
+        self.pendingCustomCommands: Counter[int] = Counter()
+
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._task: tasks.Loop = tasks.loop(seconds=interval)(self.flush)
+
+    def __repr__(self) -> str:
+        return "<UsageCounter: pending={} commands={} customCommands={}>".format(
+            self.pending, sum(self.commands.values()), self.customCommands
+        )
+
+    @property
+    def pending(self) -> int:
+        return len(self.pendingCommands) + len(self.pendingCustomCommands)
+
+    async def load(self) -> None:
+        """Load persisted usage counters from database"""
+        for name, uses in await db.CommandUsage.all().values_list("name", "uses"):
+            self.commands[name] += uses
+
+        total = await db.Commands.annotate(total=Sum("uses")).first().values_list("total", flat=True)
+        self.customCommands = int(total or 0)  # type: ignore
+
+    def start(self) -> None:
+        if not self._task.is_running():
+            self._task.start()
+
+    async def close(self) -> None:
+        # Let a running flush finish instead of cancelling it mid-write
+        async with self._lock:
+            self._task.cancel()
+        await self.flush()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Increment built-in command's usage"""
+        self.commands[name] += amount
+        self.pendingCommands[name] += amount
+
+    def incrementCustom(self, _id: int, amount: int = 1) -> None:
+        """Increment custom command's usage"""
+        self.customCommands += amount
+        self.pendingCustomCommands[_id] += amount
+
+    async def flush(self) -> None:
+        """Write pending increments to database"""
+        async with self._lock:
+            if not self.pending:
+                return
+
+            commands, self.pendingCommands = self.pendingCommands, Counter()
+            customCommands, self.pendingCustomCommands = self.pendingCustomCommands, Counter()
+
+            # Group custom commands by their increment, most of them only
+            # used once or twice between flushes, so this usually ends up
+            # being one or two UPDATE statements
+            byAmount: defaultdict[int, list[int]] = defaultdict(list)
+            for _id, amount in customCommands.items():
+                byAmount[amount].append(_id)
+
+            namesByAmount: defaultdict[int, list[str]] = defaultdict(list)
+            for name, amount in commands.items():
+                namesByAmount[amount].append(name)
+
+            committed = False
+            try:
+                async with in_transaction():
+                    for amount, ids in byAmount.items():
+                        await db.Commands.filter(id__in=ids).update(uses=F("uses") + amount)
+
+                    # Upsert, insert missing rows (name is unique, so a row
+                    # inserted by another process is left alone) then increment
+                    if commands:
+                        await db.CommandUsage.bulk_create(
+                            [db.CommandUsage(name=name, uses=0) for name in commands], ignore_conflicts=True
+                        )
+                    for amount, names in namesByAmount.items():
+                        await db.CommandUsage.filter(name__in=names).update(uses=F("uses") + amount)
+                committed = True
+            except BaseORMException as err:
+                self.logger.warning(f"Failed to flush command usage: {err}")
+            finally:
+                if not committed:
+                    # Put them back (also when cancelled), will be retried on the next flush
+                    self.pendingCommands.update(commands)
+                    self.pendingCustomCommands.update(customCommands)
+
+
+async def compactCommandUsage() -> int:
+    """|coro|
+
+    Merge duplicate command usage rows (created by older versions when two
+    processes counted a new command at the same time) into a single row.
+    Returns how many rows removed.
+
+    One-time data migration, must run before name's unique constraint is
+    added.
+    """
+    removed = 0
+    names = (
+        await db.CommandUsage.annotate(count=Count("id")).group_by("name").filter(count__gt=1).values_list("name", flat=True)
+    )
+    for name in names:
+        rows = await db.CommandUsage.filter(name=name).order_by("id").values_list("id", "uses")
+        async with in_transaction():
+            await db.CommandUsage.filter(id=rows[0][0]).update(uses=sum(uses for _, uses in rows))
+            removed += await db.CommandUsage.filter(id__in=[_id for _id, _ in rows[1:]]).delete()
+
+    return removed
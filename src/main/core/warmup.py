@@ -0,0 +1,92 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Iterable, NamedTuple
+
+from tortoise.models import Model
+
+from . import db
+from .data import Cache, CacheProperty
+from .settings import GuildSettings
+
+
+__all__ = ("WarmUpResult", "warmCache")
+
+
+# cache namespace -> (table, column)
+WARM_UP_TABLES: tuple[tuple[str, type[Model], str], ...] = (
+    ("prefixes", db.Prefixes, "prefix"),
+    ("disabled", db.Disabled, "command"),
+    ("guildMutes", db.GuildMutes, "mutedId"),
+)
+
+
+class WarmUpResult(NamedTuple):
+    guilds: int
+    rows: int
+    queries: int
+    elapsed: float  # in seconds
+
+
+def _chunks(ids: list[int], size: int) -> Iterable[list[int]]:
+    for i in range(0, len(ids), size):
+        yield ids[i : i + size]
+
+
+async def _loadChunk(cache: CacheProperty, table: type[Model], column: str, guildIds: list[int]) -> int:
+    """Load a chunk of guilds with a single query, returns how many rows loaded"""
+    rows = await table.filter(guild_id__in=guildIds).order_by("id").values_list("guild_id", column)
+    values: dict[int, list[Any]] = {}
+    for guildId, value in rows:
+        values.setdefault(guildId, []).append(value)
+
+    for guildId in guildIds:
+        # Guild without any rows is cached too, otherwise it'll still hit the
+        # database on its first lookup
+        cache.prime(guildId, values.get(guildId, []))
+    return len(rows)
+
+
+async def warmCache(cache: Cache, guildIds: Iterable[int], chunkSize: int = 1000) -> WarmUpResult:
+    """|coro|
+
+    Bulk-load guild settings into the cache, instead of loading them one
+    query per table per guild on their first lookup.
+
+    Each table is loaded in chunks of `chunkSize` guilds. Keys that already
+    cached (or being fetched) are left untouched.
+    """
+    start = time.perf_counter()
+
+    ids = sorted(set(guildIds))
+    if cache.maxSize:
+        # No point loading guilds that'll get evicted right away
+        ids = ids[: cache.maxSize]
+
+    rows = queries = 0
+    for name, table, column in WARM_UP_TABLES:
+        namespace: CacheProperty | None = getattr(cache, name, None)
+        if namespace is None:
+            continue
+
+        for chunk in _chunks(ids, chunkSize):
+            rows += await _loadChunk(namespace, table, column, chunk)
+            queries += 1
+
+    settings: CacheProperty | None = getattr(cache, "guildSettings", None)
+    if settings is not None:
+        for chunk in _chunks(ids, chunkSize):
+            empty = GuildSettings()
+            for guildId, value in (await GuildSettings.fetchMany(chunk)).items():
+                settings.prime(guildId, value)
+                # Joined into a single row per guild
+                rows += value != empty
+            queries += 1
+
+    return WarmUpResult(len(ids), rows, queries, time.perf_counter() - start)
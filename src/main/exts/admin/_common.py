@@ -37,7 +37,7 @@ async def handleGreetingConfig(
     if not arguments:
         # TODO - Revisit once more input introduced to modals
         defMsg = await guild.getConfig(f"{type}Msg") or "No message is set"
-        currentChannel = await guild.getConfig(f"{type}Ch")
+        currentChannel = await guild.getChannel(f"{type}Ch")
 
         e = ZEmbed.default(ctx)
         e.title = f"{guild.name}'s {type.title()} Configuration"
@@ -141,12 +141,12 @@ class EventHandler(commands.Cog, CogMixin):
         }
 
     async def handleGreeting(self, member: discord.Member, type: str) -> None:
-        channel = await self.bot.getGuildConfig(member.guild.id, f"{type}Ch", "GuildChannels")
-        channel = self.bot.get_channel(channel or 0)
+        settings = await self.bot.getGuildSettings(member.guild.id)
+        channel = self.bot.get_channel(settings.channel(f"{type}Ch") or 0)
         if not channel:
             return
 
-        message = await self.bot.getGuildConfig(member.guild.id, f"{type}Msg")
+        message = settings.config(f"{type}Msg")
         if not message:
             message = ("Welcome" if type == "welcome" else "Goodbye") + ", {member}!"
 
@@ -173,7 +173,8 @@ class EventHandler(commands.Cog, CogMixin):
     async def onMemberJoin(self, member: discord.Member) -> None:
         """Welcome message"""
         await self.handleGreeting(member, "welcome")
-        autoRole = await self.bot.getGuildConfig(member.guild.id, "autoRole", "GuildRoles")
+        # Already cached by handleGreeting
+        autoRole = (await self.bot.getGuildSettings(member.guild.id)).autoRole
         if autoRole:
             try:
                 await member.add_roles(
@@ -659,6 +660,10 @@ class EventHandler(commands.Cog, CogMixin):
                     "guilds": len(self.bot.guilds),
                     "users": len(self.bot.users),
                     "commands": sum(self.bot.commandUsage.values()),
+                    "customCommands": self.bot.customCommandUsage,
+                    "cache": self.bot.cache.stats(),
+                    "guildPurge": self.bot.guildPurger.stats(),
+                    "queries": self.bot.queryStats.stats(),
                 }
             case _:
                 data = {"test": str(request)}
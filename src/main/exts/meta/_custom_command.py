@@ -6,12 +6,14 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from __future__ import annotations
 
+from typing import TYPE_CHECKING, Any
+
 import discord
 from discord.ext import commands
 
 from src import tse
 
-from ...core import checks, db
+from ...core import checks, db, queries
 from ...core.context import Context
 from ...core.guild import GuildWrapper
 from ...utils import reactsToMessage, utcnow
@@ -23,6 +25,10 @@ from ._errors import (
 )
 
 
+if TYPE_CHECKING:
+    from ...core.bot import ziBot
+
+
 _blocks = [
     tse.AssignmentBlock(),
     tse.EmbedBlock(),
@@ -37,6 +43,65 @@ _blocks = [
 ENGINE = tse.Interpreter(_blocks)
 
 
+class CustomCommandIndex:
+    """In-memory name -> custom command lookup table for a single guild
+
+    Loaded with one joined query, so resolving a name (or an alias) never hit
+    the database until the index is invalidated.
+    """
+
+    __slots__ = ("commands", "names")
+
+    def __init__(self) -> None:
+        # cmd_id -> CustomCommand kwargs
+        self.commands: dict[int, dict[str, Any]] = {}
+        # name/alias -> cmd_id
+        self.names: dict[str, int] = {}
+
+    def __repr__(self) -> str:
+        return f"<CustomCommandIndex: commands={len(self.commands)} names={len(self.names)}>"
+
+    @classmethod
+    async def fetch(cls, guildId: int) -> CustomCommandIndex:
+        index = cls()
+
+        rows = await queries.fetchCustomCommands(guildId)
+        for name, _id, cmdName, content, description, category, uses, url, ownerId, enabled in rows:
+            index.names[name] = _id
+
+            data = index.commands.get(_id)
+            if data is None:
+                data = index.commands[_id] = {
+                    "id": _id,
+                    "name": cmdName,
+                    "content": content,
+                    "description": description,
+                    "category": category,
+                    "aliases": [],
+                    "uses": uses,
+                    "url": url,
+                    "owner": ownerId,
+                    "enabled": enabled,
+                }
+
+            if name != cmdName:
+                data["aliases"].append(name)
+
+        return index
+
+    def get(self, name: str) -> dict[str, Any] | None:
+        _id = self.names.get(name)
+        if _id is None:
+            return None
+        return self.commands[_id]
+
+    def incrementUses(self, _id: int, amount: int = 1) -> None:
+        try:
+            self.commands[_id]["uses"] += amount
+        except KeyError:
+            pass
+
+
 class CustomCommand(commands.Converter):
     """Object for custom command."""
 
@@ -138,8 +203,11 @@ class CustomCommand(commands.Converter):
         if not self.enabled:
             raise CCommandDisabled
 
-        # Increment uses
-        await db.Commands.filter(id=self.id).update(uses=self.uses + 1)
+        # Increment uses, written to database later by bot's usage counter
+        ctx.bot.usage.incrementCustom(self.id)
+        index: CustomCommandIndex | None = ctx.bot.cache.customCommands.get(ctx.guild.id)  # type: ignore
+        if index:
+            index.incrementUses(self.id)
 
         result = self._processTag(ctx, argument)
         embed = result.actions.get("embed")
@@ -168,39 +236,32 @@ class CustomCommand(commands.Converter):
         if react:
             ctx.bot.loop.create_task(reactsToMessage(msg, react))
 
+    @staticmethod
+    async def getIndex(bot: ziBot, guildId: int) -> CustomCommandIndex:
+        """Get guild's custom command index, load it from database if it's not cached yet"""
+        return await bot.cache.customCommands.fetch(guildId)  # type: ignore
+
+    @staticmethod
+    async def invalidate(bot: ziBot, guildId: int) -> None:
+        """Drop guild's custom command index, should be called everytime a
+        command (or its alias) is added, edited or removed"""
+        bot.cache.customCommands.clear(guildId)  # type: ignore
+        await bot.publishCacheInvalidation("customCommands", guildId)
+
     @classmethod
     async def get(cls, context: Context, command: str) -> CustomCommand:
         guild: GuildWrapper | None = context.guild
         if not guild:
             raise CCommandNotInGuild
 
-        lookup: db.CommandsLookup | None = await db.CommandsLookup.filter(name=command, guild_id=guild.id).first()
-        if not lookup:
-            # No command found
-            raise CCommandNotFound(command)
-
-        _id = lookup.cmd_id  # type: ignore
-        name = lookup.name
+        index = await cls.getIndex(context.bot, guild.id)
 
-        results: db.CommandsLookup | None = await db.CommandsLookup.filter(cmd_id=_id).prefetch_related("cmd")  # type: ignore
-        if not results:
+        data = index.get(command)
+        if not data:
+            # No command found
             raise CCommandNotFound(command)
 
-        cmd: db.Commands = results[0].cmd  # type: ignore
-
-        return cls(
-            id=_id,
-            content=cmd.content,
-            name=cmd.name,
-            invokedName=name,
-            description=cmd.description,
-            category=cmd.category,
-            aliases=[alias.name for alias in results if alias.name != cmd.name],
-            uses=cmd.uses,
-            url=cmd.url,
-            owner=cmd.ownerId,
-            enabled=cmd.enabled,
-        )
+        return cls(**(data | {"aliases": list(data["aliases"])}), invokedName=command)
 
     @staticmethod
     async def getAll(context: Context | discord.Object, category: str = None) -> list[CustomCommand]:
@@ -4,16 +4,12 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
-from ...core import db
+from ...core import queries
 
 
-async def getDisabledCommands(bot, guildId):
-    if bot.cache.disabled.get(guildId) is None:
-        dbDisabled = await db.Disabled.filter(guild_id=guildId)
+async def fetchDisabledCommands(guildId: int) -> frozenset[str]:
+    return frozenset(await queries.fetchDisabledCommands(guildId))
 
-        try:
-            bot.cache.disabled.extend(guildId, [c.command for c in dbDisabled])
-        except ValueError:
-            return []
 
-    return bot.cache.disabled.get(guildId, [])
+async def getDisabledCommands(bot, guildId: int) -> frozenset[str]:
+    return await bot.cache.disabled.fetch(guildId)
@@ -15,7 +15,7 @@ from discord.ext import commands
 
 from ....core import checks, db
 from ....core.context import Context
-from ....core.data import CacheListProperty, CacheUniqueViolation
+from ....core.data import CacheProperty, CacheSetProperty
 from ....core.embed import ZEmbed
 from ....core.guild import CCMode, GuildWrapper
 from ....core.menus import ZChoices, choice
@@ -23,10 +23,10 @@ from ....core.mixin import CogMixin
 from ....utils import utcnow
 from ....utils.format import formatCmdName
 from .._checks import hasCCPriviledge
-from .._custom_command import CustomCommand, ManagedCustomCommand
+from .._custom_command import CustomCommand, CustomCommandIndex, ManagedCustomCommand
 from .._errors import CCommandAlreadyExists, CCommandNoPerm, CCommandNotFound
 from .._flags import CmdManagerFlags
-from .._utils import getDisabledCommands
+from .._utils import fetchDisabledCommands, getDisabledCommands
 
 
 if TYPE_CHECKING:
@@ -50,10 +50,21 @@ class MetaCustomCommands(commands.Cog, CogMixin):
         # Cache for disabled commands
         self.bot.cache.add(
             "disabled",
-            cls=CacheListProperty,
-            unique=True,
+            cls=CacheSetProperty,
+            fetcher=fetchDisabledCommands,
         )
 
+        # Cache for guild's custom command index (name -> command)
+        self.bot.cache.add("customCommands", cls=CacheProperty, fetcher=self.fetchCommandIndex)
+
+    async def fetchCommandIndex(self, guildId: int) -> CustomCommandIndex:
+        """Fetcher for `bot.cache.customCommands`"""
+        index = await CustomCommandIndex.fetch(guildId)
+        # Include uses that haven't been written to database yet
+        for _id, amount in self.bot.usage.pendingCustomCommands.items():
+            index.incrementUses(_id, amount)
+        return index
+
     # TODO: Separate tags from custom command
     @commands.group(
         aliases=("cmd", "tag", "script"),
@@ -90,6 +101,7 @@ class MetaCustomCommands(commands.Cog, CogMixin):
             url=kwargs.get("url"),
         )
         lookup = await db.CommandsLookup.create(cmd_id=cmd.id, name=name, guild_id=ctx.guild.id)
+        await CustomCommand.invalidate(self.bot, ctx.guild.id)
         if cmd and lookup:
             return cmd.id, lookup.name
         return (None,) * 2
@@ -224,15 +236,17 @@ class MetaCustomCommands(commands.Cog, CogMixin):
             return await ctx.try_reply("Nothing changed.")
 
         await db.Commands.filter(id=command.id).update(url=link)
+        await CustomCommand.invalidate(self.bot, ctx.requireGuild().id)
 
         return await ctx.success(
             "\nYou can do `{}command update {}` to update the content".format(ctx.clean_prefix, name),
             title="`{}` url has been set to <{}>".format(name, url),
         )
 
-    async def updateCommandContent(self, _: Context, command: ManagedCustomCommand, content):
+    async def updateCommandContent(self, ctx: Context, command: ManagedCustomCommand, content):
         """Update command's content"""
         update = await db.Commands.filter(id=command.id).update(content=content)
+        await CustomCommand.invalidate(self.bot, ctx.requireGuild().id)
         if update:
             return True
         return False
@@ -305,6 +319,7 @@ class MetaCustomCommands(commands.Cog, CogMixin):
             return await ctx.error("Alias `{}` already exists!".format(alias))
 
         insert = await db.CommandsLookup.create(cmd_id=command.id, name=alias, guild_id=ctx.guild.id)
+        await CustomCommand.invalidate(self.bot, ctx.guild.id)
 
         if insert:
             return await ctx.success(title="Alias `{}` for `{}` has been created".format(alias, command))
@@ -390,6 +405,7 @@ class MetaCustomCommands(commands.Cog, CogMixin):
             return await ctx.success(title="{} already in {}!".format(command, category))
 
         update = await db.Commands.filter(id=command.id).update(category=category)
+        await CustomCommand.invalidate(self.bot, ctx.guild.id)
 
         if update:
             return await ctx.success(title="{}'s category has been set to {}!".format(command, category))
@@ -443,6 +459,7 @@ class MetaCustomCommands(commands.Cog, CogMixin):
         else:
             # NOTE: Aliases will be deleted automatically
             await db.Commands.filter(id=command.id).delete()
+        await CustomCommand.invalidate(self.bot, ctx.guild.id)
 
         return await ctx.success(title="{} `{}` has been removed".format("Alias" if isAlias else "Command", command.name))
 
@@ -560,9 +577,9 @@ class MetaCustomCommands(commands.Cog, CogMixin):
             if not added:
                 return await ctx.error(title="No commands succesfully disabled")
 
-            self.bot.cache.disabled.extend(ctx.guild.id, added)  # type: ignore
-
             await db.Disabled.bulk_create([db.Disabled(guild_id=ctx.guild.id, command=str(cmd)) for cmd in added])
+            self.bot.invalidateCache("disabled", ctx.guild.id)
+            await self.bot.publishCacheInvalidation("disabled", ctx.guild.id)
 
             return await ctx.success(title="`{}` commands has been disabled".format(len(added)))
 
@@ -576,21 +593,19 @@ class MetaCustomCommands(commands.Cog, CogMixin):
                 return await ctx.error(title=alreadyMsg.format(name))
 
             await db.Commands.filter(id=command.id).update(enabled=False)
+            await CustomCommand.invalidate(self.bot, ctx.guild.id)
             return await ctx.success(title=successMsg.format(name))
 
         if mode == "command":
             cmdName = chosen[0]
 
-            # Make sure disable command is cached from database
-            await getDisabledCommands(self.bot, ctx.guild.id)
-
-            try:
-                self.bot.cache.disabled.append(ctx.guild.id, cmdName)  # type: ignore
-            except CacheUniqueViolation:
+            if cmdName in await getDisabledCommands(self.bot, ctx.guild.id):
                 # check if command already disabled
                 return await ctx.error(title=alreadyMsg.format(cmdName))
 
             await db.Disabled.create(guild_id=ctx.guild.id, command=cmdName)
+            self.bot.invalidateCache("disabled", ctx.guild.id)
+            await self.bot.publishCacheInvalidation("disabled", ctx.guild.id)
             return await ctx.success(title=successMsg.format(cmdName))
 
     @command.command(
@@ -634,19 +649,14 @@ class MetaCustomCommands(commands.Cog, CogMixin):
         if mode == "category":
             disabled = await getDisabledCommands(self.bot, ctx.guild.id)
 
-            removed = []
-            for c in chosen[0].get_commands():
-                if c.name not in disabled:
-                    continue
-                self.bot.cache.disabled.remove(ctx.guild.id, c.name)  # type: ignore
-                removed.append(c.name)
+            removed = [c.name for c in chosen[0].get_commands() if c.name in disabled]
 
             if not removed:
                 return await ctx.error(title="No commands succesfully enabled")
 
-            filtered = db.Disabled.filter(guild_id=ctx.guild.id)
-            for cmd in removed:
-                await filtered.filter(command=cmd).delete()
+            await db.Disabled.filter(guild_id=ctx.guild.id, command__in=removed).delete()
+            self.bot.invalidateCache("disabled", ctx.guild.id)
+            await self.bot.publishCacheInvalidation("disabled", ctx.guild.id)
 
             return await ctx.success(title="`{}` commands has been enabled".format(len(removed)))
 
@@ -660,18 +670,19 @@ class MetaCustomCommands(commands.Cog, CogMixin):
                 return await ctx.error(title=alreadyMsg.format(name))
 
             await db.Commands.filter(id=command.id).update(enabled=True)
+            await CustomCommand.invalidate(self.bot, ctx.guild.id)
             return await ctx.success(title=successMsg.format(name))
 
         if mode == "command":
             cmdName = chosen[0]
 
-            try:
-                self.bot.cache.disabled.remove(ctx.guild.id, cmdName)  # type: ignore
-            except (ValueError, IndexError):
+            if cmdName not in await getDisabledCommands(self.bot, ctx.guild.id):
                 # command already enabled
                 return await ctx.error(title=alreadyMsg.format(cmdName))
 
             await db.Disabled.filter(guild_id=ctx.guild.id, command=cmdName).delete()
+            self.bot.invalidateCache("disabled", ctx.guild.id)
+            await self.bot.publishCacheInvalidation("disabled", ctx.guild.id)
 
             return await ctx.success(title=successMsg.format(cmdName))
 
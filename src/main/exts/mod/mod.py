@@ -12,7 +12,6 @@ from discord.ext import commands
 
 from ...core import checks, db
 from ...core.converter import BannedMember, Hierarchy, MemberOrUser, TimeAndArgument
-from ...core.data import CacheUniqueViolation
 from ...core.embed import ZEmbed
 from ...core.errors import MissingMuteRole
 from ...core.menus import ZMenuPagesView
@@ -427,15 +426,7 @@ class Moderation(commands.Cog, CogMixin):
     async def getMutedMembers(self, guildId: int):
         # Getting muted members from db/cache
         # Will cache db results automatically
-        if (mutedMembers := self.bot.cache.guildMutes.get(guildId)) is None:  # type: ignore
-            dbMutes = await db.GuildMutes.filter(guild_id=guildId)
-
-            try:
-                mutedMembers = [m.mutedId for m in dbMutes]
-                self.bot.cache.guildMutes.extend(guildId, mutedMembers)  # type: ignore
-            except ValueError:
-                mutedMembers = []
-        return mutedMembers
+        return await self.bot.cache.guildMutes.fetch(guildId)  # type: ignore
 
     async def manageMuted(
         self,
@@ -450,29 +441,30 @@ class Moderation(commands.Cog, CogMixin):
         memberId = member.id
         guildId = member.guild.id
 
-        await self.getMutedMembers(guildId)
+        mutedMembers = await self.getMutedMembers(guildId)
 
+        # Only used for checking, the cache is invalidated after writing
         if mode is False:
             # Remove member from mutedMembers list
-            try:
-                self.bot.cache.guildMutes.remove(guildId, memberId)  # type: ignore
-            except IndexError:
+            if memberId not in mutedMembers:
                 # It's not in the list so we'll just return
                 return
 
             await db.GuildMutes.filter(guild_id=guildId, mutedId=memberId).delete()
+            self.bot.invalidateCache("guildMutes", guildId)
+            await self.bot.publishCacheInvalidation("guildMutes", guildId)
 
             self.bot.dispatch("member_unmuted", member, mutedRole)
 
         elif mode is True:
             # Add member to mutedMembers list
-            try:
-                self.bot.cache.guildMutes.add(guildId, memberId)  # type: ignore
-            except CacheUniqueViolation:
+            if memberId in mutedMembers:
                 # Already in the list
                 return
 
             await db.GuildMutes.create(guild_id=guildId, mutedId=memberId)
+            self.bot.invalidateCache("guildMutes", guildId)
+            await self.bot.publishCacheInvalidation("guildMutes", guildId)
 
             self.bot.dispatch("member_muted", member, mutedRole)
 
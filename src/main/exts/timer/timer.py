@@ -8,7 +8,9 @@ from __future__ import annotations
 
 import asyncio
 import datetime as dt
-import sys
+import heapq
+import os
+import socket
 from contextlib import suppress
 from typing import TYPE_CHECKING, Optional
 
@@ -16,6 +18,9 @@ import discord
 import pytz
 from discord.app_commands import locale_str as _
 from discord.ext import commands
+from tortoise import connections
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
 
 from ...core import commands as cmds
 from ...core import db
@@ -79,62 +84,234 @@ class Timer(commands.Cog, CogMixin):
     icon = "🕑"
     cc = True
 
+    # Timers expiring within this window are kept in memory
+    WINDOW = dt.timedelta(days=40)
+    # Rows loaded per query
+    CHUNK_SIZE = 1000
+    # How long a claimed timer is reserved for the claiming process, if it's
+    # not done by then (e.g. it crashed) other processes may reclaim it
+    LEASE = dt.timedelta(minutes=5)
+
     def __init__(self, bot: ziBot) -> None:
         super().__init__(bot)
 
-        pyVer = sys.version_info
-        if pyVer[1] >= 10:
-            self.haveData = asyncio.Event()
-        else:
-            self.haveData = asyncio.Event(loop=bot.loop)
-        self._currentTimer: Optional[TimerData] = None
+        # Min-heap of (expires, id), the timer itself is stored in `_timers`.
+        # Cancelled timers are removed from `_timers` only, and skipped once
+        # they reach the top of the heap
+        self._heap: list[tuple[dt.datetime, int]] = []
+        self._timers: dict[int, TimerData] = {}
+        # Every timer expiring before this is in memory
+        self._loadedUntil: dt.datetime = self.now()
+
+        self._wakeUp: asyncio.Event = asyncio.Event()
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+        # Identifies this process when claiming timers, processes sharing the
+        # same database only dispatch timers they claimed
+        self.workerId: str = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        # Due timers left unclaimed or with expired lease (e.g. created by
+        # another process) are looked up periodically
+        self._nextSweep: dt.datetime = self.now()
 
     async def cog_load(self) -> None:
         self.task = self.bot.loop.create_task(self.dispatchTimers())
 
-    def cog_unload(self) -> None:
+    async def cog_unload(self) -> None:
         task = getattr(self, "task", None)
         if task:
             task.cancel()
+            # Wait for it to give up its claimed timers
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def now(self) -> dt.datetime:
+        """Current time used for scheduling, overridden to simulate time (e.g.
+        `src.benchmark.timers`)"""
+        return utcnow()
+
+    async def sleep(self, seconds: float) -> None:
+        """Sleep for `seconds`, or until woken up by a sooner timer"""
+        # Not `wait_for`, it swallows cancellation if woken up at the same time
+        waiter = asyncio.ensure_future(self._wakeUp.wait())
+        try:
+            await asyncio.wait([waiter], timeout=seconds)
+        finally:
+            waiter.cancel()
 
     def restartTimer(self) -> None:
         self.task.cancel()
         self.task = self.bot.loop.create_task(self.dispatchTimers())
 
-    async def getActiveTimer(self, days: int = 7) -> Optional[TimerData]:
-        data = await db.Timer.filter(expires__lt=utcnow() + dt.timedelta(days=days)).order_by("expires").values()  # type: ignore
-        return TimerData(data[0]) if data else None
-
-    async def waitForActiveTimer(self, days: int = 7) -> Optional[TimerData]:
-        timer: Optional[TimerData] = await self.getActiveTimer(days=days)
-        if timer is not None:
-            self.haveData.set()
-            return timer
-
-        self.haveData.clear()
-        self._currentTimer: Optional[TimerData] = None
-        await self.haveData.wait()
-        return await self.getActiveTimer(days=days)
+    @property
+    def nextTimer(self) -> Optional[TimerData]:
+        """Timer that will be dispatched next"""
+        while self._heap:
+            timer = self._timers.get(self._heap[0][1])
+            if timer is not None:
+                return timer
+            heapq.heappop(self._heap)
+        return None
+
+    def _push(self, timer: TimerData) -> None:
+        self._timers[timer.id] = timer
+        heapq.heappush(self._heap, (timer.expires, timer.id))
+
+    async def loadTimers(self) -> None:
+        """(Re)load timers expiring within `WINDOW` from database, also used
+        after timers are changed directly in database"""
+        async with self._lock:
+            until = self.now() + self.WINDOW
+            timers: dict[int, TimerData] = {}
+
+            lastId = None
+            while True:
+                query = db.Timer.filter(expires__lt=until)
+                if lastId is not None:
+                    query = query.filter(id__gt=lastId)
+                rows = await query.order_by("id").limit(self.CHUNK_SIZE).values()
+                for row in rows:
+                    timers[row["id"]] = TimerData(row)
+                if len(rows) < self.CHUNK_SIZE:
+                    break
+                lastId = rows[-1]["id"]
+
+            self._timers = timers
+            self._heap = [(timer.expires, timer.id) for timer in timers.values()]
+            heapq.heapify(self._heap)
+            self._loadedUntil = until
+        self._wakeUp.set()
+
+    async def cancelTimers(self, **filters) -> int:
+        """Delete timers matching `filters` (e.g. owner=..., event=...),
+        returns how many deleted"""
+        async with self._lock:
+            ids = await db.Timer.filter(**filters).values_list("id", flat=True)
+            if not ids:
+                return 0
+            await db.Timer.filter(id__in=ids).delete()
+            for _id in ids:
+                self._timers.pop(_id, None)  # type: ignore
+        self._wakeUp.set()
+        return len(ids)
+
+    async def claimTimers(self, ids: list[int]) -> set[int]:
+        """Claim timers' lease, returns ids of timers claimed by this process.
+
+        Timers claimed by another process are skipped unless their lease
+        already expired."""
+        now = self.now()
+        until = now + self.LEASE
+        claimable = Q(claimedBy=None) | Q(claimedUntil__lt=now)
+        lockRows = connections.get("default").capabilities.support_for_update
+
+        claimed: set[int] = set()
+        for i in range(0, len(ids), self.CHUNK_SIZE):
+            chunk = ids[i : i + self.CHUNK_SIZE]
+            if lockRows:
+                # PostgreSQL/MySQL, rows being claimed by another process are
+                # skipped instead of waited on
+                async with in_transaction() as conn:
+                    rows = (
+                        await db.Timer.filter(claimable, id__in=chunk)
+                        .select_for_update(skip_locked=True)
+                        .using_db(conn)
+                        .only("id")
+                    )
+                    chunk = [row.id for row in rows]
+                    if chunk:
+                        await db.Timer.filter(id__in=chunk).using_db(conn).update(
+                            claimedBy=self.workerId, claimedUntil=until
+                        )
+            else:
+                # SQLite, conditional UPDATE is atomic on its own. Timers
+                # holding this exact lease are the ones we claimed
+                await db.Timer.filter(claimable, id__in=chunk).update(claimedBy=self.workerId, claimedUntil=until)
+                query = db.Timer.filter(id__in=chunk, claimedBy=self.workerId, claimedUntil=until)
+                chunk = await query.values_list("id", flat=True)  # type: ignore
+            claimed.update(chunk)
+        return claimed
+
+    async def releaseTimers(self, ids: list[int]) -> None:
+        """Give up this process' lease on timers, so other processes may claim
+        them right away"""
+        for i in range(0, len(ids), self.CHUNK_SIZE):
+            await db.Timer.filter(id__in=ids[i : i + self.CHUNK_SIZE], claimedBy=self.workerId).update(
+                claimedBy=None, claimedUntil=None
+            )
 
-    async def callTimer(self, timer: TimerData) -> None:
-        # delete the timer
-        await db.Timer.filter(id=timer.id).delete()
+    async def reclaimTimers(self, now: dt.datetime) -> list[TimerData]:
+        """Due timers that's not in memory, either created by another
+        process or left by a process that failed to finish them"""
+        rows = (
+            await db.Timer.filter(Q(claimedBy=None) | Q(claimedUntil__lt=now), expires__lte=now)
+            .order_by("expires")
+            .limit(self.CHUNK_SIZE)
+            .values()
+        )
+        for row in rows:
+            self._timers.pop(row["id"], None)
+        return [TimerData(row) for row in rows]
 
-        # dispatch the event
-        eventName = f"{timer.event}_timer_complete"
-        self.bot.dispatch(eventName, timer)
+    async def callTimers(self, timers: list[TimerData]) -> None:
+        # claim the timers, so other processes won't dispatch them
+        ids = [timer.id for timer in timers]
+        try:
+            claimed = await self.claimTimers(ids)
+        except asyncio.CancelledError:
+            # Unloaded before dispatching them, don't hold them until the
+            # lease expired
+            await self.releaseTimers(ids)
+            raise
+        timers = [timer for timer in timers if timer.id in claimed]
+
+        # dispatch the events
+        for timer in timers:
+            self.bot.dispatch(f"{timer.event}_timer_complete", timer)
+
+        # delete the timers, if this fails they'll be reclaimed once the
+        # lease expired
+        ids = [timer.id for timer in timers]
+        for i in range(0, len(ids), self.CHUNK_SIZE):
+            await db.Timer.filter(id__in=ids[i : i + self.CHUNK_SIZE], claimedBy=self.workerId).delete()
+
+    def _popDue(self, now: dt.datetime) -> list[TimerData]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _id = heapq.heappop(self._heap)
+            timer = self._timers.pop(_id, None)
+            if timer is not None:
+                due.append(timer)
+        return due
 
     async def dispatchTimers(self) -> None:
         try:
-            while not self.bot.is_closed():
-                timer = self._currentTimer = await self.waitForActiveTimer(days=40)
-                now = utcnow()
+            await self.loadTimers()
 
-                if timer.expires >= now:  # type: ignore # Already waited for active timer
-                    sleepAmount = (timer.expires - now).total_seconds()  # type: ignore
-                    await asyncio.sleep(sleepAmount)
-
-                await self.callTimer(timer)  # type: ignore
+            while not self.bot.is_closed():
+                now = self.now()
+                if now + self.WINDOW / 2 >= self._loadedUntil:
+                    # Half of the window has passed, load the upcoming timers
+                    await self.loadTimers()
+
+                due = {timer.id: timer for timer in self._popDue(now)}
+                if now >= self._nextSweep:
+                    self._nextSweep = now + self.LEASE
+                    for timer in await self.reclaimTimers(now):
+                        due.setdefault(timer.id, timer)
+
+                if due:
+                    await self.callTimers(list(due.values()))
+                    continue
+
+                # Sleep until the next timer expires, or woken up early by a
+                # sooner timer
+                nextTimer = self.nextTimer
+                wakeUpAt = min(
+                    nextTimer.expires if nextTimer else self._loadedUntil - self.WINDOW / 2,
+                    self._nextSweep,
+                )
+                self._wakeUp.clear()
+                await self.sleep(max((wakeUpAt - now).total_seconds(), 0))
         except asyncio.CancelledError:
             raise
         except (OSError, discord.ConnectionClosed):
@@ -143,38 +320,36 @@ class Timer(commands.Cog, CogMixin):
     async def createTimer(self, *args, **kwargs) -> TimerData:
         when, event, *args = args
 
-        now = kwargs.pop("created", utcnow())
+        now = kwargs.pop("created", self.now())
         owner = kwargs.pop("owner", None)
 
-        whenTs = when
-        nowTs = now
+        values = {
+            "event": event,
+            "extra": {"args": args, "kwargs": kwargs},
+            "expires": when,
+            "created": now,
+            "owner": owner,
+        }
+        _dbTimer = await db.Timer.create(**values)
 
         timer: TimerData = TimerData.temporary(
             event=event,
             args=args,
             kwargs=kwargs,
-            expires=whenTs,
-            created=nowTs,
+            expires=when,
+            created=now,
             owner=owner,
         )
-        delta = (when - now).total_seconds()
-
-        values = {
-            "event": event,
-            "extra": {"args": args, "kwargs": kwargs},
-            "expires": whenTs,
-            "created": nowTs,
-            "owner": owner,
-        }
-        _dbTimer = await db.Timer.create(**values)
         timer.id = _dbTimer.id
 
-        if delta <= (86400 * 40):  # 40 days
-            self.haveData.set()
+        async with self._lock:
+            if when < self._loadedUntil:
+                # Otherwise it'll be loaded once it's within the window
+                self._push(timer)
 
-        if self._currentTimer and when < self._currentTimer.expires:
-            # cancel the task and re-run it
-            self.restartTimer()
+                nextTimer = self.nextTimer
+                if nextTimer is timer:
+                    self._wakeUp.set()
 
         return timer
 
@@ -26,7 +26,10 @@ from pyparsing import (
     alphas,
     delimitedList,
 )
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
 from tortoise.functions import Max
+from tortoise.transactions import in_transaction
 
 from ..core import db
 
@@ -290,6 +293,23 @@ def decodeMorse(msg):
     return decoded
 
 
+async def _nextCaseId(guildId: int) -> int:
+    """Increment guild's case counter, should be called inside a transaction
+
+    The UPDATE locks guild's counter row until the transaction ends, so
+    concurrent cases always get different number.
+    """
+    updated = await db.CaseCounter.filter(guild_id=guildId).update(lastCaseId=F("lastCaseId") + 1)
+    if not updated:
+        # Guild's first case (or its counter hasn't been backfilled yet)
+        q = await db.CaseLog.filter(guild_id=guildId).annotate(caseNum=Max("caseId")).first()
+        caseNum = (q.caseNum if q else 0) or 0  # type: ignore
+        await db.CaseCounter.create(guild_id=guildId, lastCaseId=caseNum + 1)
+        return caseNum + 1
+
+    return await db.CaseCounter.filter(guild_id=guildId).first().values_list("lastCaseId", flat=True)  # type: ignore
+
+
 async def doCaselog(
     bot,
     *,
@@ -299,20 +319,37 @@ async def doCaselog(
     targetId: int,
     reason: str,
 ) -> Optional[int]:
-    q = await db.CaseLog.filter(guild_id=guildId).annotate(caseNum=Max("caseId")).first()
-    caseNum = (q.caseNum or 0) + 1  # type: ignore
-
-    if caseNum:
-        await db.CaseLog.create(
-            caseId=caseNum,
-            guild_id=guildId,
-            type=type,
-            modId=modId,
-            targetId=targetId,
-            reason=reason,
-            createdAt=utcnow(),
-        )
-        return int(caseNum)
+    for retry in range(2):
+        try:
+            async with in_transaction():
+                caseNum = await _nextCaseId(guildId)
+                await db.CaseLog.create(
+                    caseId=caseNum,
+                    guild_id=guildId,
+                    type=type,
+                    modId=modId,
+                    targetId=targetId,
+                    reason=reason,
+                    createdAt=utcnow(),
+                )
+            return int(caseNum)
+        except IntegrityError:
+            # Another case created guild's counter at the same time, the
+            # counter exists now so try again
+            if retry:
+                raise
+
+
+async def backfillCaseCounters() -> int:
+    """Create case counter for guilds that have cases but no counter yet,
+    returns how many counters created"""
+    counted = set(await db.CaseCounter.all().values_list("guild_id", flat=True))
+    rows = await db.CaseLog.annotate(caseNum=Max("caseId")).group_by("guild_id").values_list("guild_id", "caseNum")
+    counters = [
+        db.CaseCounter(guild_id=guildId, lastCaseId=caseNum or 0) for guildId, caseNum in rows if guildId not in counted
+    ]
+    await db.CaseCounter.bulk_create(counters)
+    return len(counters)
 
 
 TAG_IN_MD = {
@@ -369,8 +406,8 @@ def isNsfw(channel) -> bool:
         return isinstance(channel, discord.DMChannel)
 
 
-async def getGuildRole(bot, guildId: int, roleType: str):
-    return await bot.getGuildConfig(guildId, roleType, "GuildRoles")
+async def getGuildRole(bot, guildId: int, roleType: str) -> Optional[int]:
+    return (await bot.getGuildSettings(guildId)).role(roleType)
 
 
 async def setGuildRole(bot, guildId: int, roleType: str, roleId: Optional[int]):
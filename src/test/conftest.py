@@ -6,9 +6,13 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from __future__ import annotations
 
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Iterator
+
 import aiohttp
 import discord
 import discord.ext.test as dpytest
+import pytest
 import pytest_asyncio
 from discord.ext.test import factories
 
@@ -41,3 +45,31 @@ async def bot():
     testBot.i18n.set(discord.Locale.american_english)
     yield testBot
     await testBot.close()
+
+
+@pytest.fixture
+def maxQueries(bot: ziBot) -> Callable[..., ContextManager[None]]:
+    """Assert maximum database queries made per command run
+
+    Usage
+    -----
+    >>> with maxQueries(2):
+    ...     await dpytest.message(">prefix list")
+    """
+
+    @contextmanager
+    def check(limit: int) -> Iterator[None]:
+        before = {name: tuple(stats) for name, stats in bot.queryStats.commands.items()}
+        yield
+
+        ran = {}
+        for name, (runs, queries, *_) in bot.queryStats.commands.items():
+            oldRuns, oldQueries, *_ = before.get(name, (0, 0))
+            if runs > oldRuns:
+                ran[name] = (runs - oldRuns, queries - oldQueries)
+
+        assert ran, "No command ran"
+        for name, (runs, queries) in ran.items():
+            assert queries <= limit * runs, f"'{name}' made {queries} queries in {runs} run(s), expected at most {limit}"
+
+    return check
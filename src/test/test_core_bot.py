@@ -6,11 +6,26 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from __future__ import annotations
 
+import asyncio
+import json
+from contextlib import asynccontextmanager, suppress
+
 import discord.ext.test as dpytest
 import pytest
+import zmq
+import zmq.asyncio
 from discord.ext.commands.errors import BadFlagArgument
+from tortoise.exceptions import IntegrityError, OperationalError
 
-from main.core.bot import ziBot
+from main.core import db, settings, usage
+from main.core.bot import CACHE_INVALIDATE_TOPIC, ziBot
+from main.core.context import Context
+from main.core.prefix import PrefixMatcher
+from main.core.purge import GuildPurger
+from main.core.reconcile import reconcileGuilds
+from main.core.settings import GuildSettings, GuildSettingsStore
+from main.core.warmup import warmCache
+from main.utils import utcnow
 
 
 @pytest.mark.asyncio
@@ -18,3 +33,326 @@ async def testBotMentioned(bot: ziBot):
     """Test prefix list being sent when bot is mentioned"""
     await dpytest.message(bot.user.mention)  # type: ignore
     assert not dpytest.verify().message().nothing()
+
+
+@pytest.mark.asyncio
+async def testNonCommandSkipsContext(bot: ziBot, monkeypatch: pytest.MonkeyPatch):
+    """Test context only being built for prefixed messages"""
+    built = []
+    contextFromMatch = bot._contextFromMatch
+
+    def track(message, match, cls=Context):
+        built.append(message.content)
+        return contextFromMatch(message, match, cls=cls)
+
+    monkeypatch.setattr(bot, "_contextFromMatch", track)
+    await dpytest.message("just chatting")
+    await dpytest.message(">ping")
+    assert built == [">ping"]
+
+
+def testPrefixMatcher():
+    """Test compiled prefix matcher resolving prefix and priority"""
+    matcher = PrefixMatcher(">", ("?", ">>", "zi "), 1)
+
+    assert matcher.match("hello") is None
+    assert matcher.match("") is None
+    assert matcher.match("zi") is None
+    assert matcher.match(">ping") == (">", "")
+    assert matcher.match(">>ping") == (">", ">")
+    assert matcher.match("?!ping") == ("?", "!")
+    assert matcher.match("zi ./ping") == ("zi ", "./")
+    assert matcher.match("<@1> ping") == ("<@1> ", "")
+    assert matcher.match("<@!1> >ping") == ("<@!1> ", ">")
+
+
+@pytest.mark.asyncio
+async def testCacheWarmUp(bot: ziBot):
+    """Test guild settings being bulk-loaded into the cache"""
+    guildId = dpytest.get_config().guilds[0].id
+    await db.Prefixes.create(guild_id=guildId, prefix="?")
+    await db.GuildConfigs.create(guild_id=guildId, ccMode=2)
+
+    result = await warmCache(bot.cache, [guildId])
+    assert result.guilds == 1
+    assert result.rows >= 2
+
+    # Should be served from cache without touching the database
+    await db.Prefixes.filter(guild_id=guildId).delete()
+    assert bot.cache.prefixes.get(guildId) == ["?"]  # type: ignore
+    assert bot.cache.guildSettings.get(guildId).ccMode == 2  # type: ignore
+    assert bot.cache.guildMutes.get(guildId) == frozenset()  # type: ignore
+
+
+@pytest.mark.asyncio
+async def testCacheInvalidation(bot: ziBot):
+    """Test cache invalidation published by other process being applied"""
+    guildId = dpytest.get_config().guilds[0].id
+    bot.cache.prefixes.set(guildId, ["?"])  # type: ignore
+
+    # Published by this process, should be ignored
+    bot.onCacheInvalidation(json.dumps([bot.instanceId, "prefixes", guildId]).encode())
+    assert guildId in bot.cache.prefixes  # type: ignore
+
+    bot.onCacheInvalidation(json.dumps(["peer", "prefixes", guildId]).encode())
+    assert guildId not in bot.cache.prefixes  # type: ignore
+    assert guildId not in bot.cache.prefixMatchers  # type: ignore
+
+    # Unknown namespace and invalid payload shouldn't raise
+    bot.onCacheInvalidation(json.dumps(["peer", "unknown", guildId]).encode())
+    bot.onCacheInvalidation(json.dumps(["peer", "__class__", guildId]).encode())
+    bot.onCacheInvalidation(json.dumps(["peer", "prefixes", "not an id"]).encode())
+    bot.onCacheInvalidation(json.dumps(["peer", "prefixes"]).encode())
+    bot.onCacheInvalidation(b"not a json")
+
+
+@pytest.mark.asyncio
+async def testPeerSocketSurvivesBadMessage(bot: ziBot):
+    """Test malformed peer messages not stopping cache invalidations"""
+    guildId = dpytest.get_config().guilds[0].id
+    bot.cache.prefixes.set(guildId, ["?"])  # type: ignore
+
+    context = zmq.asyncio.Context.instance()
+    pub = context.socket(zmq.PUB)
+    pub.bind("inproc://testPeer")
+    bot.peerSocket = context.socket(zmq.SUB)
+    bot.peerSocket.setsockopt(zmq.SUBSCRIBE, CACHE_INVALIDATE_TOPIC)
+    bot.peerSocket.connect("inproc://testPeer")
+    task = asyncio.create_task(bot.onZMQReceivePeerMessage())
+    try:
+        for _ in range(100):
+            if guildId not in bot.cache.prefixes:  # type: ignore
+                break
+            await pub.send_multipart([b"guild.update", b"{}"])
+            await pub.send_multipart([CACHE_INVALIDATE_TOPIC, b'["peer", "prefixes", "bad"]'])
+            await pub.send_multipart([CACHE_INVALIDATE_TOPIC, json.dumps(["peer", "prefixes", guildId]).encode()])
+            await asyncio.sleep(0.01)
+
+        assert not task.done()
+        assert guildId not in bot.cache.prefixes  # type: ignore
+    finally:
+        task.cancel()
+        pub.close()
+        bot.peerSocket.close()
+        bot.peerSocket = None
+
+
+@pytest.mark.asyncio
+async def testGuildSettingsSnapshot(bot: ziBot):
+    """Test guild settings from every config table being loaded at once"""
+    guildId = dpytest.get_config().guilds[0].id
+    await db.GuildConfigs.create(guild_id=guildId, welcomeMsg="Hi")
+    await db.GuildChannels.create(guild_id=guildId, welcomeCh=1)
+    await db.GuildRoles.create(guild_id=guildId, autoRole=2)
+
+    snapshot = await GuildSettings.fetchMany([guildId, 0])
+    settings = snapshot[guildId]
+    assert settings.config("welcomeMsg") == "Hi"
+    assert settings.channel("welcomeCh") == 1
+    assert settings.role("autoRole") == 2
+    # Typed accessors only look up their own table
+    assert settings.config("welcomeCh") is None
+    assert snapshot[0] == GuildSettings()
+
+
+@pytest.mark.asyncio
+async def testGuildSettingsStore(bot: ziBot):
+    """Test settings changes being merged into a single row"""
+    guildId = dpytest.get_config().guilds[0].id
+    await bot.setGuildConfig(guildId, "welcomeMsg", "Hi")
+    await bot.setGuildConfig(guildId, "farewellMsg", "Bye")
+    await bot.setGuildConfig(guildId, "welcomeMsg", "Hello")
+
+    # Not written yet, but shouldn't be lost when cache is dropped
+    bot.cache.guildSettings.clear(guildId)  # type: ignore
+    assert await bot.getGuildConfig(guildId, "welcomeMsg") == "Hello"
+
+    await bot.settingsStore.flush()
+    await bot.setGuildConfig(guildId, "ccMode", 1)
+    await bot.settingsStore.flush()
+
+    rows = await db.GuildConfigs.filter(guild_id=guildId).values("welcomeMsg", "farewellMsg", "ccMode")
+    assert rows == [{"welcomeMsg": "Hello", "farewellMsg": "Bye", "ccMode": 1}]
+
+
+@pytest.mark.asyncio
+async def testGuildSettingsUpsert(bot: ziBot):
+    """Test guild settings limited to one row per guild, changes are upserted
+    without touching other columns"""
+    guildId = dpytest.get_config().guilds[0].id
+    await db.GuildConfigs.create(guild_id=guildId, ccMode=2)
+    with pytest.raises(IntegrityError):
+        await db.GuildConfigs.create(guild_id=guildId, welcomeMsg="Hi")
+
+    store = GuildSettingsStore()
+    store.set(guildId, "guildConfigs", {"welcomeMsg": "Hi"})
+    await store.flush()
+    store.set(guildId, "guildConfigs", {"welcomeMsg": "Hello"})
+    await store.close()
+
+    rows = await db.GuildConfigs.filter(guild_id=guildId).values("welcomeMsg", "ccMode")
+    assert rows == [{"welcomeMsg": "Hello", "ccMode": 2}]
+
+    # Changes being written are still visible
+    store.writing = {("guildConfigs", guildId): {"welcomeMsg": "Hey"}}
+    assert (await store.fetch(guildId)).welcomeMsg == "Hey"
+
+
+@pytest.mark.asyncio
+async def testGuildSettingsRetry(bot: ziBot, monkeypatch: pytest.MonkeyPatch):
+    """Test failed settings write being retried without another change"""
+    guildId = dpytest.get_config().guilds[0].id
+    transaction = settings.in_transaction
+    failures = []
+
+    def failOnce():
+        if not failures:
+            failures.append(True)
+            raise OperationalError("database is locked")
+        return transaction()
+
+    monkeypatch.setattr(settings, "in_transaction", failOnce)
+
+    store = GuildSettingsStore(delay=0)
+    store.set(guildId, "guildConfigs", {"welcomeMsg": "Hi"})
+    for _ in range(50):
+        await asyncio.sleep(0.01)
+        if await db.GuildConfigs.exists(guild_id=guildId):
+            break
+
+    assert failures
+    assert await db.GuildConfigs.filter(guild_id=guildId).values_list("welcomeMsg", flat=True) == ["Hi"]
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def testReconcileGuilds(bot: ziBot):
+    """Test guilds table being synced with the guilds the bot is in"""
+    await db.Guilds.bulk_create([db.Guilds(id=i) for i in (101, 102, 103, 104)])
+    # 103 is rejoined (with a duplicate deletion timer), 104 is still pending deletion
+    for guildId in (103, 103, 104):
+        await db.Timer.create(
+            event="guild_del", extra={"args": [], "kwargs": {}}, expires=utcnow(), created=utcnow(), owner=guildId
+        )
+
+    # 101 and 103 are in, 105 is new; 102 and 104 are gone
+    guildIds = [g.id for g in bot.guilds] + [101, 103, 105]
+    result = await reconcileGuilds(guildIds, chunkSize=1)
+    assert (result.inserted, result.scheduled, result.cancelled) == (1, 1, frozenset({103}))
+
+    assert await db.Guilds.filter(id=105).exists()
+    owners = await db.Timer.filter(event="guild_del").values_list("owner", flat=True)
+    assert sorted(owners) == [102, 104]  # type: ignore
+
+    # Nothing left to do
+    result = await reconcileGuilds(guildIds)
+    assert (result.inserted, result.scheduled, result.cancelled) == (0, 0, frozenset())
+
+
+@pytest.mark.asyncio
+async def testGuildPurge(bot: ziBot):
+    """Test every row of a guild being purged, without touching other guilds"""
+    for guildId in (201, 202):
+        await db.Guilds.create(id=guildId)
+        cmd = await db.Commands.create(type="text", name="hi", content="hello", ownerId=0, createdAt=utcnow())
+        await db.CommandsLookup.create(cmd_id=cmd.id, name="hi", guild_id=guildId)
+        await db.CommandsLookup.create(cmd_id=cmd.id, name="hello", guild_id=guildId)
+        await db.Prefixes.create(guild_id=guildId, prefix="?")
+        await db.GuildConfigs.create(guild_id=guildId, ccMode=1)
+        await db.CaseLog.create(guild_id=guildId, caseId=1, type="ban", modId=0, targetId=0, reason="", createdAt=utcnow())
+
+    purger = GuildPurger(chunkSize=1)
+    deleted = await purger.purge(201)
+    assert deleted == {
+        "commandsLookup": 2,
+        "commands": 1,
+        "prefixes": 1,
+        "guildConfigs": 1,
+        "caseLog": 1,
+        "guilds": 1,
+    }
+    assert purger.stats()["purged"] == 1
+
+    assert not await db.Guilds.filter(id=201).exists()
+    assert not await db.CommandsLookup.filter(guild_id=201).exists()
+    assert await db.CommandsLookup.filter(guild_id=202).count() == 2
+    assert await db.Commands.all().count() == 1
+
+    # Rejoined before its turn
+    purger.schedule(202)
+    assert purger.cancel(202)
+    assert not purger.cancel(202)
+    await purger.close()
+
+
+@pytest.mark.asyncio
+async def testUsageUpsert(bot: ziBot):
+    """Test command usage being incremented on a single row per command"""
+    await db.CommandUsage.create(name="ping", uses=5)
+    with pytest.raises(IntegrityError):
+        await db.CommandUsage.create(name="ping", uses=1)
+
+    bot.usage.increment("ping", 2)
+    bot.usage.increment("pong")
+    await bot.usage.flush()
+    bot.usage.increment("pong")
+    await bot.usage.flush()
+
+    rows = await db.CommandUsage.filter(name__in=("ping", "pong")).order_by("name").values_list("name", "uses")
+    assert rows == [("ping", 7), ("pong", 2)]
+
+
+@pytest.mark.asyncio
+async def testUsageFlushCancelled(bot: ziBot, monkeypatch: pytest.MonkeyPatch):
+    """Test increments of a flush cancelled mid-write being written by the next one"""
+    writing = asyncio.Event()
+
+    @asynccontextmanager
+    async def stuck():
+        writing.set()
+        await asyncio.Event().wait()
+        yield
+
+    bot.usage.increment("ping")
+    with monkeypatch.context() as patch:
+        patch.setattr(usage, "in_transaction", stuck)
+        task = asyncio.create_task(bot.usage.flush())
+        await writing.wait()
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    assert bot.usage.pending
+    await bot.usage.close()
+    assert await db.CommandUsage.get(name="ping").values_list("uses", flat=True) == 1
+
+
+@pytest.mark.asyncio
+async def testUsageCloseWaitsForFlush(bot: ziBot, monkeypatch: pytest.MonkeyPatch):
+    """Test closing usage counter letting the loop's running flush finish instead of cancelling it"""
+    writing = asyncio.Event()
+    resume = asyncio.Event()
+    writers = []
+    transaction = usage.in_transaction
+
+    @asynccontextmanager
+    async def slow():
+        writing.set()
+        await resume.wait()
+        writers.append(asyncio.current_task())
+        async with transaction():
+            yield
+
+    monkeypatch.setattr(usage, "in_transaction", slow)
+    bot.usage.increment("ping")
+    # Restarted loop flushes right away
+    bot.usage._task.restart()
+    await writing.wait()
+
+    close = asyncio.create_task(bot.usage.close())
+    await asyncio.sleep(0)
+    resume.set()
+    await close
+
+    assert writers == [bot.usage._task.get_task()]
+    assert await db.CommandUsage.get(name="ping").values_list("uses", flat=True) == 1
@@ -0,0 +1,170 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from main.core import db
+from main.core.data import (
+    Cache,
+    CacheDictProperty,
+    CacheListProperty,
+    CacheProperty,
+    CacheSetProperty,
+    CacheUniqueViolation,
+    ExpiringDict,
+)
+from main.core.settings import GuildSettings
+
+
+def testCacheLRUEviction():
+    """Test least recently used key being evicted when cache is full"""
+    cache = CacheProperty(maxSize=2)
+    cache.set(1, "a").set(2, "b")
+    assert cache.get(1) == "a"  # 1 is now the most recently used
+
+    cache.set(3, "c")
+    assert 2 not in cache
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+    assert cache.stats["evictions"] == 1
+
+
+def testCacheTTL(monkeypatch: pytest.MonkeyPatch):
+    """Test expired key being treated as a miss"""
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+
+    cache = CacheProperty(ttl=10)
+    cache.set(1, "a")
+    assert cache.get(1) == "a"
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get(1) is None
+    assert cache.stats == {"size": 0, "maxSize": 0, "hits": 1, "misses": 1, "evictions": 0, "expired": 1}
+
+
+def testCachePurgeExpired(monkeypatch: pytest.MonkeyPatch):
+    """Test expired keys being reclaimed without being accessed"""
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+
+    cache = Cache(ttl=10).add("prefixes", cls=CacheListProperty).add("guildConfigs", cls=CacheDictProperty)
+    cache.prefixes.set(1, [">"])  # type: ignore
+    cache.guildConfigs.set(1, {"ccMode": 0})  # type: ignore
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.purgeExpired() == 2
+    assert len(cache.prefixes) == 0  # type: ignore
+
+
+@pytest.mark.asyncio
+async def testCacheGetOrFetch():
+    """Test fetcher only being called on cache miss"""
+    calls = []
+
+    async def fetcher(key: int) -> list[str]:
+        calls.append(key)
+        return []
+
+    cache = CacheListProperty(unique=True)
+    assert await cache.getOrFetch(1, fetcher) == []
+    assert await cache.getOrFetch(1, fetcher) == []
+    assert calls == [1]
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def testCacheSetProperty():
+    """Test set cache being replaced (not mutated) on write"""
+    cache = CacheSetProperty()
+    cache.set(1, [1, 2])
+    before = cache.get(1)
+
+    cache.add(1, 3)
+    with pytest.raises(CacheUniqueViolation):
+        cache.add(1, 3)
+    cache.remove(1, 1)
+    with pytest.raises(ValueError):
+        cache.remove(1, 1)
+
+    assert before == frozenset({1, 2})
+    assert cache.get(1) == frozenset({2, 3})
+
+
+def testGuildSettingsFields():
+    """Test guild settings covering every column of guild config tables"""
+    for table, fields in GuildSettings.TABLES.items():
+        model = GuildSettings.MODELS[table]
+        assert model._meta.db_table == table
+        assert set(fields) == model._meta.db_fields - {"id", "guild_id"}
+
+    settings = GuildSettings(ccMode=1, id=5, guild_id=6)
+    assert settings.get("ccMode") == 1
+    assert settings.get("modRole") is None
+    assert settings.get("__class__") is None
+    assert settings.asDict("guildRoles") == {"modRole": None, "mutedRole": None, "autoRole": None}
+
+
+@pytest.mark.asyncio
+async def testCacheSingleFlight():
+    """Test concurrent misses for the same key only calling fetcher once"""
+    calls = []
+
+    async def fetcher(key: int) -> dict[str, int]:
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"ccMode": 0}
+
+    cache = CacheDictProperty(fetcher=fetcher)
+    results = await asyncio.gather(*[cache.fetch(1) for _ in range(10)])
+    assert all(r == {"ccMode": 0} for r in results)
+    assert calls == [1]
+
+
+@pytest.mark.asyncio
+async def testCacheInvalidatedDuringFetch():
+    """Test stale fetch result not being cached if key is invalidated mid-fetch"""
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fetcher(key: int) -> list[str]:
+        started.set()
+        await release.wait()
+        return ["stale"]
+
+    cache = CacheListProperty(fetcher=fetcher)
+    task = asyncio.create_task(cache.fetch(1))
+    await started.wait()
+    cache.clear(1)
+    release.set()
+
+    assert await task == ["stale"]
+    assert 1 not in cache
+
+
+def testExpiringDict(monkeypatch: pytest.MonkeyPatch):
+    """Test expired keys being reclaimed and overwritten keys being kept"""
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+
+    d = ExpiringDict({"a": 1, "b": 2}, maxAgeSeconds=10)
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 5)
+    d["b"] = 3  # Overwritten, should expire 10 seconds from now instead
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert "a" not in d
+    assert d["b"] == 3
+    assert dict.__len__(d) == 1
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 16)
+    assert d.get("b") is None
+    assert dict.__len__(d) == 0
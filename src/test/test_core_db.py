@@ -0,0 +1,199 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+from types import SimpleNamespace
+
+import discord
+import discord.ext.test as dpytest
+import pytest
+from tortoise import Tortoise, connections
+from tortoise.queryset import QuerySet
+
+from main.core import db, queries, schema
+from main.core.bot import ziBot
+from main.core.config import Config
+from main.core.querystats import currentCommand
+from main.core.schema import (
+    ensureSchema,
+    migrateDatabase,
+    schemaFingerprint,
+    storedDataVersion,
+    storedFingerprint,
+)
+from main.utils import backfillCaseCounters, doCaselog, utcnow
+
+
+# Hot queries, should never end up scanning the whole table
+HOT_QUERIES = {
+    "custom command lookup": lambda: db.CommandsLookup.filter(name="test", guild_id=1),
+    "custom command index": lambda: db.CommandsLookup.filter(guild_id=1),
+    "custom command aliases": lambda: db.CommandsLookup.filter(cmd_id=1),
+    "timer dispatch": lambda: db.Timer.filter(expires__lt=dt.datetime(2022, 1, 1)).order_by("expires"),
+    "guild deletion timer": lambda: db.Timer.filter(owner=1, event="guild_del"),
+    "case log": lambda: db.CaseLog.filter(guild_id=1, caseId=1),
+    "moderator cases": lambda: db.CaseLog.filter(guild_id=1, modId=1),
+    "disabled commands": lambda: db.Disabled.filter(guild_id=1),
+    "prefixes": lambda: db.Prefixes.filter(guild_id=1),
+    "muted members": lambda: db.GuildMutes.filter(guild_id=1),
+    "unmute": lambda: db.GuildMutes.filter(guild_id=1, mutedId=1),
+    "guild configs": lambda: db.GuildConfigs.filter(guild_id=1),
+}
+
+
+async def explain(query: QuerySet) -> list[str]:
+    rows = await connections.get("default").execute_query_dict(f"EXPLAIN QUERY PLAN {query.sql()}")
+    return [row["detail"] for row in rows]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", HOT_QUERIES)
+async def testHotQueryUsesIndex(bot: ziBot, name: str):
+    """Test hot queries being resolved with index instead of full table scan"""
+    plan = await explain(HOT_QUERIES[name]())
+
+    assert plan, "Empty query plan"
+    for step in plan:
+        # SQLite reports full table scan as "SCAN <table>" (without "USING ... INDEX")
+        assert not (step.startswith("SCAN") and "INDEX" not in step), f"{name}: {plan}"
+        assert "TEMP B-TREE" not in step, f"{name}: {plan}"
+
+
+@pytest.mark.asyncio
+async def testCaseNumberSequence(bot: ziBot):
+    """Test concurrent cases never sharing the same number, and existing
+    cases being backfilled into the counter"""
+    guildId = dpytest.get_config().guilds[0].id
+    for caseId in (1, 2, 5):
+        await db.CaseLog.create(
+            guild_id=guildId, caseId=caseId, type="ban", modId=0, targetId=0, reason="", createdAt=utcnow()
+        )
+
+    assert await backfillCaseCounters() == 1
+    assert await backfillCaseCounters() == 0
+
+    kwargs = dict(guildId=guildId, type="ban", modId=0, targetId=0, reason="")
+    caseNums = await asyncio.gather(*[doCaselog(bot, **kwargs) for _ in range(10)])
+    assert sorted(caseNums) == list(range(6, 16))  # type: ignore
+
+
+@pytest.mark.asyncio
+async def testRawQueries(bot: ziBot):
+    """Test raw hot-path queries returning the same data as the ORM"""
+    guildId = dpytest.get_config().guilds[0].id
+    await db.Prefixes.create(guild_id=guildId, prefix="?")
+    await db.Disabled.create(guild_id=guildId, command="ping")
+    await db.GuildMutes.create(guild_id=guildId, mutedId=1)
+    cmd = await db.Commands.create(type="text", name="hi", content="hello", ownerId=2, createdAt=utcnow())
+    await db.CommandsLookup.create(cmd_id=cmd.id, name="hi", guild_id=guildId)
+    await db.CommandsLookup.create(cmd_id=cmd.id, name="hello", guild_id=guildId)
+
+    assert await queries.fetchPrefixes(guildId) == ("?",)
+    assert await queries.fetchDisabledCommands(guildId) == ("ping",)
+    assert await queries.fetchGuildMutes(guildId) == (1,)
+    assert await queries.fetchPrefixes(0) == ()
+
+    rows = sorted(await queries.fetchCustomCommands(guildId))
+    assert rows == [
+        ("hello", cmd.id, "hi", "hello", None, "unsorted", 0, None, 2, True),
+        ("hi", cmd.id, "hi", "hello", None, "unsorted", 0, None, 2, True),
+    ]
+
+
+@pytest.mark.asyncio
+async def testSlowQueryLog(bot: ziBot, caplog: pytest.LogCaptureFixture):
+    """Test queries being accounted to the running command and slow queries being logged"""
+    bot.queryStats.threshold = 1e-9
+    with bot.queryStats.track("test", 1) as tracked:
+        await db.Guilds.all().count()
+        await queries.fetchPrefixes(1)
+
+    assert tracked.queries == 2
+    assert bot.queryStats.commands["test"][:2] == [1, 2]
+    assert "Slow query" in caplog.text
+    assert "command 'test' in guild 1" in caplog.text
+
+
+@pytest.mark.asyncio
+async def testAppCommandQueries(bot: ziBot, monkeypatch: pytest.MonkeyPatch):
+    """Test app command's queries being accounted even when it fails"""
+
+    async def failingCall(self, interaction) -> None:
+        await db.Guilds.all().count()
+        raise RuntimeError
+
+    monkeypatch.setattr(discord.app_commands.CommandTree, "_call", failingCall)
+    interaction = SimpleNamespace(
+        type=discord.InteractionType.application_command, command=SimpleNamespace(name="ping", parent=None), guild_id=1
+    )
+    with pytest.raises(RuntimeError):
+        await bot.tree._call(interaction)  # type: ignore
+
+    assert currentCommand.get() is None
+    assert bot.queryStats.commands["ping"][:2] == [1, 1]
+
+
+def testSqliteProfile():
+    """Test SQLite profile pragmas being passed to the connection, unless overridden in the URL"""
+    config = Config("", "sqlite://data/database.db?cache_size=-2000", sqliteProfile=True)
+    credentials = config.tortoiseConfig["connections"]["default"]["credentials"]
+    assert credentials["synchronous"] == "NORMAL"
+    assert credentials["cache_size"] == "-2000"
+    assert credentials["file_path"] == "data/database.db"
+
+    assert Config("", "postgres://user@host/db", sqliteProfile=True).defaultConnection == "postgres://user@host/db"
+    assert Config("", "sqlite://data/database.db").defaultConnection == "sqlite://data/database.db"
+
+
+@pytest.mark.asyncio
+async def testSchemaFingerprint(bot: ziBot):
+    """Test migration being skipped on boot when models are unchanged"""
+    assert await storedFingerprint() == schemaFingerprint()
+    assert not await ensureSchema(bot.config)
+
+    await db.SchemaFingerprint.filter(id=1).update(fingerprint="outdated")
+    assert await ensureSchema(bot.config)
+    assert await storedFingerprint() == schemaFingerprint()
+
+
+@pytest.mark.asyncio
+async def testForceMigrate(bot: ziBot):
+    """Test forced migration (`migrate --force`) initializing Tortoise by itself"""
+    await Tortoise.close_connections()
+    await Tortoise._reset_apps()
+    Tortoise._inited = False
+
+    await migrateDatabase(bot.config)
+    assert await storedFingerprint() == schemaFingerprint()
+    assert await storedDataVersion() == len(schema.DATA_MIGRATIONS)
+
+
+@pytest.mark.asyncio
+async def testDataMigrationsRunOnce(bot: ziBot, monkeypatch: pytest.MonkeyPatch):
+    """Test one-time data migrations only applied by the first migration"""
+    assert await storedDataVersion() == len(schema.DATA_MIGRATIONS)
+
+    calls = []
+
+    async def migration() -> int:
+        calls.append(1)
+        return 0
+
+    monkeypatch.setattr(schema, "DATA_MIGRATIONS", [*schema.DATA_MIGRATIONS, ("{}", migration, False)])
+    for _ in range(2):
+        await db.SchemaFingerprint.filter(id=1).update(fingerprint="outdated")
+        assert await ensureSchema(bot.config)
+    assert calls == [1]
+    assert await storedDataVersion() == len(schema.DATA_MIGRATIONS)
+
+    # New data migration is applied even if the schema is unchanged
+    monkeypatch.setattr(schema, "DATA_MIGRATIONS", [*schema.DATA_MIGRATIONS, ("{}", migration, False)])
+    assert await ensureSchema(bot.config)
+    assert not await ensureSchema(bot.config)
+    assert calls == [1, 1]
@@ -11,6 +11,7 @@ import asyncio
 import discord.ext.test as dpytest
 import pytest
 
+from main.core import db
 from main.core.bot import ziBot
 from main.core.embed import ZEmbedBuilder
 
@@ -33,6 +34,23 @@ async def testPrefixAdd(bot: ziBot):
     assert str(dpytest.get_embed(peek=True).title).endswith("added!")
 
 
+@pytest.mark.asyncio
+async def testPrefixAddEvicted(bot: ziBot, monkeypatch: pytest.MonkeyPatch):
+    """Test prefix addition not losing other prefixes when they're evicted from cache while writing"""
+    guildId = dpytest.get_config().guilds[0].id
+    await dpytest.message(">prefix + !")
+
+    create = db.Prefixes.create
+
+    async def evictingCreate(**kwargs):
+        bot.cache.prefixes.clear(guildId)  # type: ignore
+        return await create(**kwargs)
+
+    monkeypatch.setattr(db.Prefixes, "create", evictingCreate)
+    await dpytest.message(">prefix + ?")
+    assert sorted(await bot.cache.prefixes.fetch(guildId)) == ["!", "?"]  # type: ignore
+
+
 @pytest.mark.asyncio
 async def testPrefixUnique(bot: ziBot):
     """Test failed prefix addition (already exists)"""
@@ -111,3 +129,14 @@ async def testPing(bot: ziBot):
 
     # dpytest don't test fields for some reason
     assert all([e.title == be.title, all([f == be.fields[i] for i, f in enumerate(e.fields)])])
+
+
+@pytest.mark.asyncio
+async def testPrefixQueryCount(bot: ziBot, maxQueries):
+    """Test prefix commands not making more queries than needed"""
+    with maxQueries(2):
+        await dpytest.message(">prefix + !")
+    assert bot.queryStats.commands["prefix add"][0] == 1
+    with maxQueries(0):
+        # Served from cache
+        await dpytest.message(">prefix list")
@@ -9,6 +9,7 @@ from __future__ import annotations
 import discord.ext.test as dpytest
 import pytest
 
+from main.core import db
 from main.core.bot import ziBot
 from main.exts.meta._errors import CCommandAlreadyExists, CCommandNotFound
 
@@ -57,3 +58,39 @@ async def testCommandPriorityExecution(bot: ziBot):
 
     await dpytest.message(">ping")
     assert dpytest.get_message(peek=True).content != msg
+
+
+@pytest.mark.asyncio
+async def testCommandIndexInvalidation(bot: ziBot):
+    """Test custom command index being invalidated when commands are changed"""
+    await dpytest.message(">cmd + test hello")
+    await dpytest.message(">>test")
+    assert dpytest.get_message(peek=True).content == "hello"
+
+    await dpytest.message(">cmd / test alias-test")
+    await dpytest.message(">>alias-test")
+    assert dpytest.get_message(peek=True).content == "hello"
+
+    await dpytest.message(">cmd edit test world")
+    await dpytest.message(">>test")
+    assert dpytest.get_message(peek=True).content == "world"
+
+    await dpytest.message(">cmd - test")
+    with pytest.raises(CCommandNotFound):
+        await dpytest.message(">cmd - alias-test")
+
+
+@pytest.mark.asyncio
+async def testCommandUsesWriteBehind(bot: ziBot):
+    """Test custom command uses being written to database in batches"""
+    await dpytest.message(">cmd + test test")
+    await dpytest.message(">>test")
+    await dpytest.message(">>test")
+
+    cmd = await db.Commands.get(name="test")
+    assert cmd.uses == 0
+
+    await bot.usage.flush()
+    await cmd.refresh_from_db()
+    assert cmd.uses == 2
+    assert not bot.usage.pending
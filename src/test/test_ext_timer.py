@@ -0,0 +1,126 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+
+import pytest
+
+from main.core import db
+from main.core.bot import ziBot
+from main.exts.timer.timer import Timer, TimerData
+from main.utils import utcnow
+
+
+async def getTimerCog(bot: ziBot) -> Timer:
+    while not (timer := bot.get_cog("Timer")):
+        await asyncio.sleep(0.01)
+    return timer  # type: ignore
+
+
+@pytest.mark.asyncio
+async def testTimerBatchDispatch(bot: ziBot):
+    """Test due timers being dispatched together, and sooner timer not
+    restarting the dispatcher task"""
+    timer = await getTimerCog(bot)
+    task = timer.task
+
+    completed: list[TimerData] = []
+
+    async def onComplete(data: TimerData):
+        completed.append(data)
+
+    bot.add_listener(onComplete, "on_test_timer_complete")
+
+    now = utcnow()
+    later = await timer.createTimer(now + dt.timedelta(days=1), "test", owner=0)
+    for i in range(5):
+        await timer.createTimer(now - dt.timedelta(seconds=1), "test", i, owner=0)
+    assert timer.task is task
+
+    for _ in range(100):
+        if len(completed) == 5:
+            break
+        await asyncio.sleep(0.01)
+
+    assert sorted(data.args[0] for data in completed) == list(range(5))
+    assert await db.Timer.filter(event="test").values_list("id", flat=True) == [later.id]
+    assert timer.nextTimer is not None and timer.nextTimer.id == later.id
+
+    # Cancelled timer is removed from memory too
+    assert await timer.cancelTimers(event="test") == 1
+    assert timer.nextTimer is None
+
+
+@pytest.mark.asyncio
+async def testTimerLease(bot: ziBot):
+    """Test timers only claimed by one process at a time, and expired lease
+    being reclaimed"""
+    timer = await getTimerCog(bot)
+    # Another bot process sharing the same database
+    other = Timer(bot)
+    assert other.workerId != timer.workerId
+
+    # Not due yet, so the running dispatcher won't pick them up
+    now = utcnow()
+    expires = now + dt.timedelta(hours=1)
+    rows = await db.Timer.bulk_create(
+        [db.Timer(event="lease", extra={"args": [], "kwargs": {}}, expires=expires, created=now, owner=0) for _ in range(4)]
+    )
+    ids = list(await db.Timer.filter(event="lease").values_list("id", flat=True))
+    assert len(ids) == len(rows)
+
+    claimed = await timer.claimTimers(ids[:3])
+    assert claimed == set(ids[:3])
+    assert await other.claimTimers(ids) == {ids[3]}
+    assert await timer.claimTimers(ids) == set()
+
+    # Process holding the lease died, it's claimable once the lease expired
+    await db.Timer.filter(id__in=ids[1:]).update(claimedUntil=expires + Timer.LEASE)
+    await db.Timer.filter(id=ids[0]).update(claimedUntil=now - dt.timedelta(seconds=1))
+    reclaimed = await other.reclaimTimers(expires)
+    assert [data.id for data in reclaimed] == [ids[0]]
+    assert await other.claimTimers([ids[0]]) == {ids[0]}
+
+    await db.Timer.filter(event="lease").delete()
+
+
+@pytest.mark.asyncio
+async def testTimerUnload(bot: ziBot):
+    """Test unloading timer cog stopping the dispatcher, and claimed timers
+    that aren't dispatched yet being released"""
+    other = Timer(bot)
+    claiming = asyncio.Event()
+
+    async def claimTimers(ids: list[int]) -> set[int]:
+        await Timer.claimTimers(other, ids)
+        claiming.set()
+        # Unloaded before it's done claiming
+        await asyncio.Event().wait()
+        return set()
+
+    other.claimTimers = claimTimers  # type: ignore
+
+    now = utcnow()
+    await db.Timer.bulk_create(
+        [db.Timer(event="unload", extra={"args": [], "kwargs": {}}, expires=now, created=now, owner=0) for _ in range(3)]
+    )
+    timers = [TimerData(row) for row in await db.Timer.filter(event="unload").values()]
+    other.task = asyncio.create_task(other.callTimers(timers))
+    await claiming.wait()
+    assert await db.Timer.filter(event="unload", claimedBy=other.workerId).count() == 3
+
+    await other.cog_unload()
+    assert other.task.cancelled()
+    assert await db.Timer.filter(event="unload", claimedBy=None, claimedUntil=None).count() == 3
+    await db.Timer.filter(event="unload").delete()
+
+    timer = await getTimerCog(bot)
+    task = timer.task
+    await bot.remove_cog("Timer")
+    assert task.done()
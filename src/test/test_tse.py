@@ -0,0 +1,45 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+import tse
+
+
+def testCompiledScriptCache():
+    """Test TagScript only parsed once and seed variables bound per run"""
+    engine = tse.Interpreter([tse.AssignmentBlock(), tse.LooseVariableGetterBlock()], cache_size=2)
+    script = "{=(greet):Hi {user}}{greet}!"
+
+    compiled = engine.compile(script)
+    assert compiled is engine.compile(script)
+    # Only blocks without another block inside are pre-parsed
+    assert [verb is not None for verb in compiled.verbs] == [True, False, True]
+
+    for name in ("Alice", "Bob"):
+        response = engine.process(script, {"user": tse.StringAdapter(name)})
+        assert response.body == f"Hi {name}!"
+    assert engine.compile(script) is compiled
+
+    # Least recently used script is dropped
+    engine.compile("{a}")
+    engine.compile("{b}")
+    assert engine.compile(script) is not compiled
+
+
+def testSolveStopAndCharlimit():
+    """Test nested blocks, `TSE_STOP` and charlimit after solver rewrite"""
+    engine = tse.Interpreter([tse.AssignmentBlock(), tse.LooseVariableGetterBlock(), tse.StopBlock()])
+    seed = {"user": tse.StringAdapter("Alice")}
+
+    script = "{=(a):{user}}{=(b):[{a}]}{b} {unknown} {b}"
+    assert engine.process(script, seed).body == "[Alice] {unknown} [Alice]"
+    assert engine.process("before {=(a):x}{stop({a}==x):bye} after", seed).body == "before bye"
+
+    with pytest.raises(tse.WorkloadExceededError):
+        engine.process("{user}" * 10, seed, charlimit=20)
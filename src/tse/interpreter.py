@@ -1,4 +1,4 @@
-from itertools import islice
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional, Tuple
 
 from .exceptions import ProcessError, TagScriptError, WorkloadExceededError
@@ -9,6 +9,7 @@ from .verb import Verb
 __all__ = (
     "Node",
     "build_node_tree",
+    "CompiledScript",
     "Response",
     "Context",
     "Interpreter",
@@ -50,6 +51,51 @@ def build_node_tree(message: str) -> List[Node]:
     return nodes
 
 
+class CompiledScript:
+    """
+    A TagScript string parsed once, to be reused by every :meth:`Interpreter.process` call
+    with the same string.
+
+    Blocks that don't contain another block are parsed into :class:`Verb` ahead of time,
+    the rest are parsed while processing since their content depends on the blocks inside them.
+
+    Attributes
+    ----------
+    message: str
+        The TagScript string.
+    coordinates: Tuple[Tuple[int, int], ...]
+        The blocks' coordinates, in processing order.
+    verbs: Tuple[Optional[Verb], ...]
+        The pre-parsed blocks, ``None`` for blocks containing another block.
+    """
+
+    __slots__ = ("message", "coordinates", "verbs")
+
+    def __init__(self, message: str, *, verb_limit: int = 2000):
+        self.message: str = message
+        nodes = build_node_tree(message)
+        self.coordinates: Tuple[Tuple[int, int], ...] = tuple(node.coordinates for node in nodes)
+
+        verbs: List[Optional[Verb]] = []
+        previous_start = -1
+        for start, end in self.coordinates:
+            # Blocks are ordered by their closing bracket, so a block containing
+            # another block always comes right after one of its inner blocks
+            if previous_start > start:
+                verbs.append(None)
+            else:
+                verbs.append(Verb(message[start : end + 1], limit=verb_limit))
+            previous_start = start
+        self.verbs: Tuple[Optional[Verb], ...] = tuple(verbs)
+
+    def __repr__(self):
+        return "<CompiledScript blocks={0}>".format(len(self.coordinates))
+
+    def nodes(self) -> List[Node]:
+        """Fresh nodes to be solved, since nodes are modified while processing"""
+        return [Node(coords, verb) for coords, verb in zip(self.coordinates, self.verbs)]
+
+
 class Response:
     """
     Response is another packaged class that contains data
@@ -110,14 +156,32 @@ class Interpreter:
     ----------
     blocks: List[Block]
         A list of blocks to be used for TagScript processing.
+    cache_size: int
+        How many compiled TagScript strings are kept, least recently used ones are dropped first.
     """
 
-    def __init__(self, blocks: List[Block]):
+    def __init__(self, blocks: List[Block], *, cache_size: int = 1024):
         self.blocks: List[Block] = blocks
+        self.cache_size: int = cache_size
+        self._cache: "OrderedDict[str, CompiledScript]" = OrderedDict()
 
     def __repr__(self):
         return "<Interpreter blocks={0.blocks!r}>".format(self)
 
+    def compile(self, message: str) -> CompiledScript:
+        """Returns the compiled form of a TagScript string, only parsed once while it's cached."""
+        try:
+            compiled = self._cache[message]
+        except KeyError:
+            compiled = CompiledScript(message)
+            if self.cache_size > 0:
+                self._cache[message] = compiled
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(message)
+        return compiled
+
     def _get_acceptors(self, ctx: Context, node: Node):
         acceptors: List[Block] = [b for b in self.blocks if b.will_accept(ctx)]
         for b in acceptors:
@@ -126,21 +190,50 @@ class Interpreter:
                 node.output = value
                 break
 
+    @staticmethod
+    def _join(message: str, segments: List[Tuple[int, int, Optional[str]]], start: int, end: int) -> str:
+        """Text of `message[start:end]` with the solved blocks in `segments` substituted."""
+        parts = []
+        for seg_start, seg_end, text in segments:
+            parts.append(message[start:seg_start])
+            parts.append(message[seg_start : seg_end + 1] if text is None else text)
+            start = seg_end + 1
+        parts.append(message[start:end])
+        return "".join(parts)
+
     def _solve(
         self, message: str, node_ordered_list: List[Node], response: Response, charlimit: int, *, verb_limit: int = 2000
     ):
-        final = message
         total_work = 0
 
-        for i, node in enumerate(node_ordered_list):
-            # Get the updated verb string from coordinates and make the context
-            node.verb = Verb(final[node.coordinates[0] : node.coordinates[1] + 1], limit=verb_limit)
+        # Solved blocks not yet enclosed by another solved block as (start, end, text), in order of
+        # appearance. `text` is None when the block is unchanged. Blocks are ordered innermost-first,
+        # so a block's inner blocks are always at the end of this list when it's being solved.
+        segments: List[Tuple[int, int, Optional[str]]] = []
+
+        for node in node_ordered_list:
+            start, end = node.coordinates
+            split = len(segments)
+            while split and segments[split - 1][0] > start:
+                split -= 1
+            inner = segments[split:]
+            del segments[split:]
+
+            # Get the updated verb string (unless it's pre-parsed) and make the context
+            text = None
+            if node.verb is None:
+                text = self._join(message, inner, start, end + 1)
+                node.verb = Verb(text, limit=verb_limit)
             ctx = Context(node.verb, response, self, message)
 
             # Get all blocks that will attempt to take this
             self._get_acceptors(ctx, node)
             if node.output is None:
-                continue  # If there was no value output, no need to text deform.
+                # If there was no value output, the block is kept as is (with its inner blocks solved)
+                if text is None and any(segment[2] is not None for segment in inner):
+                    text = self._join(message, inner, start, end + 1)
+                segments.append((start, end, text))
+                continue
 
             if charlimit is not None:
                 total_work = total_work + len(node.output)  # Record how much we've done so far, for the rate limit
@@ -150,30 +243,11 @@ class Interpreter:
                         f"attempted were {total_work}/{charlimit}"
                     )
 
-            start, end = node.coordinates
-            message_slice_len = (end + 1) - start
-            replacement_len = len(node.output)
-            differential = replacement_len - message_slice_len  # The change in size of `final` after the change is applied
             if "TSE_STOP" in response.actions:
-                return final[:start] + node.output
-            final = final[:start] + node.output + final[end + 1 :]
-
-            # if each coordinate is later than `start` then it needs the diff applied.
-            for future_n in islice(node_ordered_list, i + 1, None):
-                new_start = None
-                new_end = None
-                if future_n.coordinates[0] > start:
-                    new_start = future_n.coordinates[0] + differential
-                else:
-                    new_start = future_n.coordinates[0]
-
-                if future_n.coordinates[1] > start:
-                    new_end = future_n.coordinates[1] + differential
-                else:
-                    new_end = future_n.coordinates[1]
-                future_n.coordinates = (new_start, new_end)
-
-        return final
+                return self._join(message, segments, 0, start) + node.output
+            segments.append((start, end, node.output))
+
+        return self._join(message, segments, 0, len(message))
 
     def process(self, message: str, seed_variables: Dict[str, Adapter] = None, charlimit: Optional[int] = None) -> Response:
         """Processes a given TagScript string.
@@ -208,7 +282,7 @@ class Interpreter:
         if seed_variables is not None:
             response.variables = {**response.variables, **seed_variables}
 
-        node_ordered_list = build_node_tree(message_input)
+        node_ordered_list = self.compile(message_input).nodes()
 
         try:
             output = self._solve(message_input, node_ordered_list, response, charlimit)